@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from foodgram.db import check_connections
+
+# Адреса, которые в режиме ASGI обслуживаются асинхронными view.
+ASYNC_URL_NAMES = {
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+    'recipes-list', 'recipes-detail', 'recipes-download-shopping-cart',
+}
+
+# Django 3.2 выполняет синхронные view под ASGI в одном общем потоке,
+# поэтому медленный запрос задерживает все остальные. Горячие view
+# работают в отдельном пуле; его размер ограничивает и число
+# соединений с БД на процесс.
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS,
+    thread_name_prefix='async-view'
+)
+
+
+def materialize(response):
+    """Потоковый ответ, собранный в обычный."""
+    materialized = HttpResponse(
+        b''.join(response.streaming_content), status=response.status_code)
+    for header, value in response.items():
+        materialized[header] = value
+    return materialized
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет view DRF в потоке пула вместе с рендерингом ответа."""
+    close_old_connections()
+    check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        if response.streaming:
+            # Django 3.2 перебирает потоковый ответ прямо в цикле событий,
+            # где запросы к БД запрещены, поэтому он читается здесь.
+            return materialize(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка над view, которая не занимает цикл событий."""
+    run = sync_to_async(call_view, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_urlpatterns(urlpatterns):
+    """Заменяет view адресов из ASYNC_URL_NAMES асинхронными обёртками."""
+    return [
+        URLPattern(
+            pattern.pattern, async_view(pattern.callback),
+            pattern.default_args, pattern.name
+        ) if pattern.name in ASYNC_URL_NAMES else pattern
+        for pattern in urlpatterns
+    ]
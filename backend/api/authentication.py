@@ -0,0 +1,139 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import incr_counter
+
+# Счётчики копятся в процессе и сбрасываются в общий кеш пачками,
+# чтобы не добавлять запись в кеш к каждому запросу.
+COUNTERS_FLUSH_EVERY = 100
+
+
+class LocalTokenCache:
+    """LRU в памяти процесса: ключ токена -> (пользователь, срок)."""
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            user, expires = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self.lock:
+            self.items[key] = (
+                user, time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL)
+            self.items.move_to_end(key)
+            while len(self.items) > settings.TOKEN_CACHE_SIZE:
+                self.items.popitem(last=False)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class TokenCacheStats:
+    def __init__(self):
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, name):
+        with self.lock:
+            self.pending[name] += 1
+            if sum(self.pending.values()) < COUNTERS_FLUSH_EVERY:
+                return
+            pending, self.pending = self.pending, Counter()
+        for counter, delta in pending.items():
+            incr_counter(f'auth-token:{counter}', delta)
+
+
+local_tokens = LocalTokenCache()
+token_stats = TokenCacheStats()
+
+
+def shared_key(key):
+    # В общем кеше не хранятся сами токены.
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def cached_user(key):
+    user = local_tokens.get(key)
+    if user is not None:
+        return user
+    if settings.TOKEN_CACHE_SHARED:
+        user = cache.get(shared_key(key))
+        if user is not None:
+            local_tokens.set(key, user)
+    return user
+
+
+def cache_user(key, user):
+    local_tokens.set(key, user)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.set(shared_key(key), user, settings.TOKEN_CACHE_TTL)
+
+
+def invalidate_tokens(keys):
+    """Удаляет токены из кешей: при выходе, смене пароля, деактивации."""
+    local_tokens.delete(keys)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.delete_many([shared_key(key) for key in keys])
+
+
+def invalidate_user_tokens(users):
+    """
+    Удаляет из кешей токены пользователей (queryset или список id)
+    после фиксации транзакции. Сохранение пользователя делает это
+    сигналом, а после QuerySet.update(), например
+    update(is_active=False), вызывается явно.
+    """
+    keys = list(Token.objects.filter(
+        user__in=users).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: invalidate_tokens(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берёт пользователя по токену из кеша,
+    а не из БД. Записи удаляются сигналами api.signals; процессы, которые
+    не видят общего кеша, узнают о выходе через TOKEN_CACHE_LOCAL_TTL.
+    QuerySet.update() сигналов не отправляет: без invalidate_user_tokens
+    деактивированный так пользователь входит по токену ещё до
+    TOKEN_CACHE_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        user = cached_user(key)
+        if user is None:
+            token_stats.record('misses')
+            user, token = super().authenticate_credentials(key)
+            cache_user(key, user)
+            return user, token
+        token_stats.record('hits')
+        # Экземпляр из кеша процесса общий для потоков: view получает
+        # свою копию, чтобы изменения не попадали в другие запросы.
+        user = copy.copy(user)
+        return user, Token(key=key, user=user)
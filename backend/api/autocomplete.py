@@ -0,0 +1,70 @@
+from bisect import bisect_left
+
+from django.conf import settings
+from recipes.models import Ingredient
+
+from .cache import LazyIndex
+
+
+class IngredientIndex:
+    """
+    Отсортированный по названию массив ингредиентов в памяти процесса.
+    Поиск по префиксу - бинарный, по вхождению - просмотр массива.
+    """
+
+    def __init__(self, ingredients):
+        self.items = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.keys = [item[0] for item in self.items]
+
+    def __len__(self):
+        return len(self.items)
+
+    def search(self, query, limit):
+        query = query.casefold()
+        found = []
+        position = bisect_left(self.keys, query)
+        while (len(found) < limit and position < len(self.keys)
+               and self.keys[position].startswith(query)):
+            found.append(self.items[position])
+            position += 1
+        if len(found) < limit:
+            for item in self.items:
+                if query in item[0] and not item[0].startswith(query):
+                    found.append(item)
+                    if len(found) == limit:
+                        break
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+class LazyIngredientIndex(LazyIndex):
+    ttl_setting = 'INGREDIENT_AUTOCOMPLETE_TTL'
+
+    def build(self):
+        return IngredientIndex(Ingredient.objects.values_list(
+            'pk', 'name', 'measurement_unit').iterator())
+
+
+ingredient_index = LazyIngredientIndex()
+
+
+def search_in_database(query, limit):
+    queryset = Ingredient.objects.order_by('name').values(
+        'id', 'name', 'measurement_unit')
+    found = list(queryset.filter(name__istartswith=query)[:limit])
+    if len(found) < limit:
+        found += queryset.filter(name__icontains=query).exclude(
+            name__istartswith=query)[:limit - len(found)]
+    return found
+
+
+def autocomplete(query, limit):
+    """Сначала совпадения по префиксу, затем по вхождению."""
+    if settings.INGREDIENT_AUTOCOMPLETE_IN_MEMORY:
+        return ingredient_index.get().search(query, limit)
+    return search_in_database(query, limit)
@@ -0,0 +1,263 @@
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTrendingScore,
+                            ShoppingCart, ShoppingListItem, Tag)
+from users.models import Follow
+
+from .search import update_search_vectors, uses_postgresql
+
+User = get_user_model()
+
+MONTH = 30 * 24 * 60 * 60
+
+SYLLABLES = (
+    'ба', 'ва', 'го', 'да', 'же', 'за', 'ки', 'ла', 'ма', 'но', 'па', 'ро',
+    'са', 'то', 'ур', 'фи', 'ха', 'це', 'чи', 'ша', 'ще', 'ям', 'ко', 'ль',
+)
+
+# Кеш, который ничего не хранит: запросы к БД видны при каждом вызове.
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def synthetic_name(rng, words=2):
+    return ' '.join(
+        ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(words)
+    )
+
+
+def create_ingredients(rng, prefix, count):
+    # Префикс в названии: наборы с разными префиксами и одним seed
+    # не пересекаются по уникальной паре (name, measurement_unit).
+    names = [
+        f'{synthetic_name(rng)} {prefix}-{number}' for number in range(count)
+    ]
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit='г') for name in names),
+        batch_size=5000
+    )
+    return list(Ingredient.objects.filter(
+        name__in=names).values_list('pk', flat=True))
+
+
+def create_recipes(rng, author_ids, count, ingredient_ids, per_recipe):
+    """
+    Рецепты случайных авторов из author_ids со случайными ингредиентами
+    в количестве из диапазона per_recipe. Возвращает queryset рецептов.
+    """
+    Recipe.objects.bulk_create(
+        (Recipe(author_id=rng.choice(author_ids),
+                name=synthetic_name(rng, 3), text=synthetic_name(rng, 20),
+                cooking_time=rng.randint(1, 120))
+         for _ in range(count)),
+        batch_size=5000
+    )
+    queryset = Recipe.objects.filter(author__in=author_ids)
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=pk, ingredient_id=ingredient_id, amount=1)
+         for pk in queryset.values_list('pk', flat=True).iterator()
+         for ingredient_id in rng.sample(
+             ingredient_ids, rng.randint(*per_recipe))),
+        batch_size=5000
+    )
+    return queryset
+
+
+def create_synthetic_recipes(rng, username, recipes, ingredients,
+                             per_recipe):
+    """
+    Создаёт автора, ingredients ингредиентов и recipes рецептов.
+    Возвращает queryset рецептов и список id ингредиентов.
+    """
+    author = User.objects.create(
+        username=username, email=f'{username}@example.com')
+    ingredient_ids = create_ingredients(rng, username, ingredients)
+    queryset = create_recipes(
+        rng, [author.pk], recipes, ingredient_ids, per_recipe)
+    return queryset, ingredient_ids
+
+
+def backdate(rng, queryset, batch_size=100):
+    """
+    Разбрасывает добавления по последнему месяцу, начиная с TRENDING_LAG
+    назад, чтобы они попали в счета трендов. auto_now_add перезаписывает
+    created при вставке, поэтому даты ставятся после неё: пачке
+    случайных записей - одна дата.
+    """
+    ids = list(queryset.values_list('pk', flat=True))
+    rng.shuffle(ids)
+    now = timezone.now()
+    for start in range(0, len(ids), batch_size):
+        queryset.filter(pk__in=ids[start:start + batch_size]).update(
+            created=now - timedelta(
+                seconds=rng.randint(settings.TRENDING_LAG + 1, MONTH)))
+
+
+def create_synthetic_dataset(rng, prefix, users, recipes, ingredients=2000,
+                             per_recipe=(3, 12), tags=10, favorites=20,
+                             carts=5, follows=10):
+    """
+    Пользователи, теги, ингредиенты и рецепты, а также избранное,
+    списки покупок и подписки: favorites, carts и follows - сколько
+    записей приходится на одного пользователя. Возвращает словарь
+    с id пользователей, queryset рецептов и slug тегов.
+    """
+    User.objects.bulk_create(
+        (User(username=f'{prefix}-{number}',
+              email=f'{prefix}-{number}@example.com',
+              first_name=synthetic_name(rng, 1),
+              last_name=synthetic_name(rng, 1), password='!')
+         for number in range(users)),
+        batch_size=5000
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith=f'{prefix}-').values_list('pk', flat=True))
+    slugs = [f'{prefix}-tag-{number}' for number in range(tags)]
+    # Цвет тега уникален: занятые другими наборами пропускаются.
+    used = set(Tag.objects.values_list('color', flat=True))
+    colors = [
+        color for color in (
+            f'#{number:06X}'
+            for number in rng.sample(range(0x1000000), tags + len(used))
+        ) if color not in used
+    ]
+    Tag.objects.bulk_create(
+        Tag(name=slug, color=color, slug=slug)
+        for slug, color in zip(slugs, colors)
+    )
+    tag_ids = list(
+        Tag.objects.filter(slug__in=slugs).values_list('pk', flat=True))
+    queryset = create_recipes(
+        rng, user_ids, recipes, create_ingredients(rng, prefix, ingredients),
+        per_recipe
+    )
+    recipe_ids = list(queryset.values_list('pk', flat=True))
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+         for pk in recipe_ids
+         for tag_id in rng.sample(tag_ids, rng.randint(1, min(3, tags)))),
+        batch_size=5000
+    )
+    for model, per_user in ((Favorite, favorites), (ShoppingCart, carts)):
+        model.objects.bulk_create(
+            (model(user_id=user_id, recipe_id=pk)
+             for user_id in user_ids
+             for pk in rng.sample(recipe_ids, min(per_user, len(recipe_ids)))),
+            batch_size=5000
+        )
+        backdate(rng, model.objects.filter(user__in=user_ids))
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id in user_ids
+         for author_id in set(rng.sample(
+             user_ids, min(follows, len(user_ids)))) - {user_id}),
+        batch_size=5000
+    )
+    # bulk_create не отправляет сигналы, поэтому производные данные
+    # заполняются явно.
+    Recipe.objects.recount(recipe_ids)
+    ShoppingListItem.objects.rebuild(user_ids)
+    FeedItem.objects.rebuild(user_ids)
+    # Добавления задним числом могли оказаться раньше отметки трендов:
+    # счета новых рецептов по ним считаются здесь, по более поздним -
+    # следующим запуском update_scores.
+    RecipeTrendingScore.objects.rebuild_recipes(queryset)
+    if uses_postgresql():
+        update_search_vectors(recipe_ids)
+    return synthetic_dataset(prefix)
+
+
+def synthetic_dataset(prefix):
+    """Данные, ранее созданные create_synthetic_dataset с этим prefix."""
+    user_ids = list(User.objects.filter(
+        username__startswith=f'{prefix}-').order_by('pk').values_list(
+            'pk', flat=True))
+    return {
+        'users': user_ids,
+        'recipes': Recipe.objects.filter(author__in=user_ids),
+        'tags': list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-tag-').values_list('slug', flat=True)),
+    }
+
+
+def endpoint_values(dataset):
+    """Значения для подстановки в шаблоны адресов API."""
+    recipe = dataset['recipes'].order_by('?').first()
+    return {
+        'author': recipe.author_id,
+        'recipe': recipe.pk,
+        'tag': dataset['tags'][0],
+        'word': recipe.name.split()[0],
+        'prefix': Ingredient.objects.order_by('?').first().name[:2],
+        'ingredients': ','.join(map(str, recipe.recipeingredients.values_list(
+            'ingredient_id', flat=True))),
+    }
+
+
+def require_sync_views():
+    """
+    Асинхронные view работают со своими соединениями с БД: они не видят
+    откатываемых данных, а их запросы не попадают в замеры.
+    """
+    if settings.ASYNC_VIEWS:
+        raise CommandError('Запустите команду с ASYNC_VIEWS=False.')
+
+
+@contextmanager
+def rolled_back():
+    """Всё, что создано внутри блока, откатывается после замеров."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timed(func):
+    """Результат func() и время вызова в миллисекундах."""
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def measure(func, arguments):
+    """Время в миллисекундах для каждого вызова func(*args)."""
+    durations = []
+    for args in arguments:
+        started = time.perf_counter()
+        func(*args)
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+def percentile(durations, fraction):
+    ordered = sorted(durations)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summary(durations):
+    return {
+        'count': len(durations),
+        'mean': statistics.fmean(durations),
+        'p50': percentile(durations, 0.5),
+        'p95': percentile(durations, 0.95),
+        'p99': percentile(durations, 0.99),
+    }
+
+
+def format_summary(name, durations):
+    result = summary(durations)
+    return (
+        f'{name}: n={result["count"]} mean={result["mean"]:.2f}ms '
+        f'p50={result["p50"]:.2f}ms p95={result["p95"]:.2f}ms '
+        f'p99={result["p99"]:.2f}ms'
+    )
@@ -0,0 +1,170 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.utils.http import urlencode
+from recipes.models import CatalogVersion
+
+
+def catalog_key(model):
+    return f'catalog:{model._meta.label_lower}'
+
+
+def catalog_state(model):
+    """Версия и время последнего изменения справочника."""
+    return CatalogVersion.objects.state(model)
+
+
+def touch_catalog(model):
+    CatalogVersion.objects.touch(model)
+
+
+def catalog_response_key(model, version, request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    return (
+        f'{catalog_key(model)}:{version}:{request.path}?{query}'
+    )
+
+
+def cache_catalog_data(key, data):
+    cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+
+
+PER_PROCESS_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def require_shared_cache(endpoint):
+    """
+    Команда работает в своём процессе и не видит кеш в памяти
+    веб-процессов: счётчики в нём для неё всегда пустые.
+    """
+    if settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        raise CommandError(
+            'Кеш хранится в памяти каждого процесса: задайте общий '
+            'CACHE_BACKEND (memcached, Redis) или смотрите статистику '
+            f'через {endpoint}.'
+        )
+
+
+def counter_key(name):
+    return f'counter:{name}'
+
+
+def incr_counter(name, delta=1):
+    """Атомарное cache.incr; создаёт счётчик при первом обращении."""
+    key = counter_key(name)
+    if cache.add(key, delta, None):
+        return delta
+    return cache.incr(key, delta)
+
+
+def get_counter(name):
+    return cache.get(counter_key(name), 0)
+
+
+def reset_counter(name):
+    cache.delete(counter_key(name))
+
+
+HIT_COUNTERS = (
+    ('Кеш рецептов', 'recipe-payload'),
+    ('Кеш токенов', 'auth-token'),
+)
+
+
+def cache_stats():
+    """Попадания и промахи кешей с общими счётчиками."""
+    stats = []
+    for title, name in HIT_COUNTERS:
+        hits = get_counter(f'{name}:hits')
+        misses = get_counter(f'{name}:misses')
+        total = hits + misses
+        stats.append({
+            'name': name,
+            'title': title,
+            'hits': hits,
+            'misses': misses,
+            'ratio': hits / total * 100 if total else 0,
+        })
+    return stats
+
+
+def reset_cache_stats():
+    for _, name in HIT_COUNTERS:
+        reset_counter(f'{name}:hits')
+        reset_counter(f'{name}:misses')
+
+
+def recipe_payload_key(recipe):
+    """
+    Ключ данных рецепта. Время изменения читается вместе со строкой
+    рецепта и сдвигается в транзакции каждого изменения, поэтому
+    данные, посчитанные до изменения, остаются под старым ключом.
+    """
+    return f'recipe-payload:{recipe.pk}:{recipe.updated:%Y%m%d%H%M%S%f}'
+
+
+def get_recipe_payloads(recipes):
+    """Закешированные данные рецептов, не зависящие от пользователя."""
+    keys = {recipe.pk: recipe_payload_key(recipe) for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    payloads = {
+        pk: cached[key] for pk, key in keys.items() if key in cached
+    }
+    incr_counter('recipe-payload:hits', len(payloads))
+    incr_counter('recipe-payload:misses', len(keys) - len(payloads))
+    return payloads
+
+
+def set_recipe_payloads(recipes, payloads):
+    cache.set_many(
+        {
+            recipe_payload_key(recipe): payloads[recipe.pk]
+            for recipe in recipes
+        },
+        settings.RECIPE_CACHE_TIMEOUT
+    )
+
+
+class LazyIndex:
+    """
+    Индекс в памяти процесса, который строится при первом запросе и по
+    истечении TTL из настройки ttl_setting. Наследник строит индекс
+    в build(), а если индекс умеет обновляться между перестроениями -
+    меняет его по изменённым объектам в refresh(index, ids).
+    """
+
+    ttl_setting = None
+
+    def __init__(self):
+        self.index = None
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self, index, ids):
+        raise NotImplementedError
+
+    def get(self):
+        with self.lock:
+            if (self.index is None or time.monotonic() - self.built_at
+                    > getattr(settings, self.ttl_setting)):
+                self.index = self.build()
+                self.built_at = time.monotonic()
+            return self.index
+
+    def update(self, ids):
+        with self.lock:
+            if self.index is not None:
+                self.refresh(self.index, ids)
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
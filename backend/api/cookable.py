@@ -0,0 +1,70 @@
+from collections import Counter, defaultdict
+
+from recipes.models import RecipeIngredient
+
+from .cache import LazyIndex
+
+
+class CookableIndex:
+    """
+    Обратный индекс в памяти процесса: ингредиент -> множество рецептов,
+    плюс число ингредиентов каждого рецепта. Для набора ингредиентов
+    пользователя совпадения считаются только по рецептам, в которых
+    есть хотя бы один из них, без соединений в БД.
+    """
+
+    def __init__(self, pairs=()):
+        self.recipes = defaultdict(set)
+        self.ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in pairs:
+            self.recipes[ingredient_id].add(recipe_id)
+            self.ingredients[recipe_id].add(ingredient_id)
+
+    def __len__(self):
+        return len(self.ingredients)
+
+    def replace(self, recipe_id, ingredient_ids):
+        """Заменяет ингредиенты рецепта; пустой набор удаляет рецепт."""
+        for ingredient_id in self.ingredients.pop(recipe_id, ()):
+            self.recipes[ingredient_id].discard(recipe_id)
+        for ingredient_id in ingredient_ids:
+            self.recipes[ingredient_id].add(recipe_id)
+        if ingredient_ids:
+            self.ingredients[recipe_id] = set(ingredient_ids)
+
+    def rank(self, ingredient_ids, max_missing=None):
+        """
+        [(id рецепта, совпало, не хватает)]: сначала рецепты, которые
+        можно приготовить целиком, затем с наименьшим числом недостающих.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.recipes.get(ingredient_id, ()))
+        ranked = [
+            (recipe_id, count, len(self.ingredients[recipe_id]) - count)
+            for recipe_id, count in matched.items()
+        ]
+        if max_missing is not None:
+            ranked = [item for item in ranked if item[2] <= max_missing]
+        ranked.sort(key=lambda item: (item[2], -item[1], -item[0]))
+        return ranked
+
+
+class LazyCookableIndex(LazyIndex):
+    ttl_setting = 'COOKABLE_INDEX_TTL'
+
+    def build(self):
+        return CookableIndex(RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id').iterator())
+
+    def refresh(self, index, recipe_ids):
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids:
+            index.replace(recipe_id, ingredients[recipe_id])
+
+
+cookable_index = LazyCookableIndex()
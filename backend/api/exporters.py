@@ -0,0 +1,52 @@
+import csv
+import json
+
+SHOPPING_LIST_TITLE = 'Список покупок от Foodgram'
+
+EXPORTERS = {}
+
+
+def register_exporter(format, content_type):
+    """Регистрирует генератор выгрузки списка покупок для формата."""
+
+    def decorator(func):
+        EXPORTERS[format] = (func, content_type)
+        return func
+
+    return decorator
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+@register_exporter('txt', 'text/plain; charset=utf-8')
+def export_txt(items):
+    yield f'{SHOPPING_LIST_TITLE}\n\n'
+    for item in items:
+        yield (
+            f'{item["name"]}'
+            f'({item["measurement_unit"]}) {item["amount"]}\n'
+        )
+
+
+@register_exporter('csv', 'text/csv; charset=utf-8')
+def export_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['amount']))
+
+
+@register_exporter('json', 'application/json')
+def export_json(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ', '
+    yield ']'
@@ -1,6 +1,16 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import Ingredient, Recipe, Tag
 
+from .search import search_recipes
+
+
+ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    # Рецепты без счёта - после всех, у которых он есть.
+    'trending': (F('trending__score').desc(nulls_last=True), '-id'),
+}
+
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
@@ -14,10 +24,20 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='get_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in ORDERINGS],
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        # Фильтры применяются в этом порядке: поиск получает уже
+        # отфильтрованный queryset, а сортировка заменяет порядок по рангу.
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
 
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -29,6 +49,14 @@ class RecipeFilter(FilterSet):
             return queryset.filter(carts__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='istartswith')
@@ -0,0 +1,54 @@
+import random
+import time
+
+from api.autocomplete import IngredientIndex, search_in_database
+from api.benchmarks import (format_summary, measure, rolled_back,
+                            synthetic_name)
+from django.core.management.base import BaseCommand
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает автодополнение ингредиентов через БД и через индекс '
+        'в памяти. Синтетические данные откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        limit = options['limit']
+        with rolled_back():
+            names = {
+                synthetic_name(rng)
+                for _ in range(options['ingredients'])
+            }
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit='г')
+                 for name in names),
+                batch_size=5000, ignore_conflicts=True
+            )
+            self.stdout.write(
+                f'Ингредиентов в таблице: {Ingredient.objects.count()}')
+            names = sorted(names)
+            queries = [
+                (rng.choice(names)[:rng.randint(1, 5)], limit)
+                for _ in range(options['queries'])
+            ]
+
+            started = time.perf_counter()
+            index = IngredientIndex(Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit').iterator())
+            self.stdout.write(
+                f'Построение индекса ({len(index)} записей): '
+                f'{(time.perf_counter() - started) * 1000:.0f}ms')
+
+            self.stdout.write(format_summary(
+                'БД', measure(search_in_database, queries)))
+            self.stdout.write(format_summary(
+                'Память', measure(index.search, queries)))
@@ -0,0 +1,74 @@
+import random
+
+from api.benchmarks import (create_synthetic_recipes, format_summary,
+                            measure, rolled_back, timed)
+from api.cookable import CookableIndex
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+from recipes.models import RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает подбор рецептов по имеющимся ингредиентам через '
+        'соединения в БД и через индекс в памяти. Синтетические данные '
+        'откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--min-per-recipe', type=int, default=3)
+        parser.add_argument('--max-per-recipe', type=int, default=12)
+        parser.add_argument('--min-have', type=int, default=5)
+        parser.add_argument('--max-have', type=int, default=40)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        page_size = options['page_size']
+        with rolled_back():
+            (recipes, ingredient_ids), duration = timed(
+                lambda: create_synthetic_recipes(
+                    rng, 'bench-cookable', options['recipes'],
+                    options['ingredients'],
+                    (options['min_per_recipe'], options['max_per_recipe'])))
+            self.stdout.write(
+                f'Создание {options["recipes"]} рецептов: {duration:.0f}ms')
+            queries = [
+                (rng.sample(ingredient_ids, rng.randint(
+                    options['min_have'], options['max_have'])),)
+                for _ in range(options['queries'])
+            ]
+
+            def in_database(have):
+                return list(recipes.annotate(
+                    total=Count('recipeingredients'),
+                    matched=Count('recipeingredients', filter=Q(
+                        recipeingredients__ingredient__in=have)),
+                ).filter(matched__gt=0).annotate(
+                    missing=F('total') - F('matched')
+                ).order_by('missing', '-matched', '-id').values_list(
+                    'pk', 'matched', 'missing')[:page_size])
+
+            index, duration = timed(lambda: CookableIndex(
+                RecipeIngredient.objects.filter(
+                    recipe__in=recipes
+                ).values_list('recipe_id', 'ingredient_id').iterator()))
+            self.stdout.write(
+                f'Построение индекса ({len(index)} рецептов): '
+                f'{duration:.0f}ms')
+
+            def in_memory(have):
+                return index.rank(have)[:page_size]
+
+            for have, in queries[:5]:
+                if in_database(have) != in_memory(have):
+                    self.stderr.write('Результаты БД и индекса различаются.')
+                    break
+            self.stdout.write(format_summary(
+                'БД', measure(in_database, queries)))
+            self.stdout.write(format_summary(
+                'Память', measure(in_memory, queries)))
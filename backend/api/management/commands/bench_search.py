@@ -0,0 +1,87 @@
+import random
+
+from api.benchmarks import (create_synthetic_recipes, format_summary,
+                            measure, rolled_back, timed)
+from api.search import (recipe_search_index, search_in_database,
+                        search_in_memory, search_vector, uses_postgresql)
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск рецептов через icontains и полнотекстовый поиск '
+        '(PostgreSQL) или индекс в памяти (другие СУБД). Синтетические '
+        'данные откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=3)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def timed(self, title, func):
+        result, duration = timed(func)
+        self.stdout.write(f'{title}: {duration:.0f}ms')
+        return result
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        page_size = options['page_size']
+        with rolled_back():
+            recipes, _ = self.timed(
+                f'Создание {options["recipes"]} рецептов',
+                lambda: create_synthetic_recipes(
+                    rng, 'bench-search', options['recipes'],
+                    options['ingredients'],
+                    (options['per_recipe'], options['per_recipe'])))
+            words = [
+                word
+                for name in recipes.values_list(
+                    'name', flat=True)[:options['queries']]
+                for word in name.split()
+            ]
+            queries = [
+                (' '.join(rng.sample(words, rng.randint(1, 2))),)
+                for _ in range(options['queries'])
+            ]
+
+            def icontains(text):
+                return list(recipes.filter(
+                    Q(name__icontains=text) | Q(text__icontains=text)
+                ).values_list('pk', flat=True)[:page_size])
+
+            self.stdout.write(format_summary(
+                'icontains', measure(icontains, queries)))
+
+            if uses_postgresql():
+                self.timed('Заполнение search_vector', lambda: recipes.update(
+                    search_vector=search_vector()))
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE recipes_recipe')
+
+                def full_text(text):
+                    return list(search_in_database(recipes, text).values_list(
+                        'pk', flat=True)[:page_size])
+
+                self.stdout.write(format_summary(
+                    'Полнотекстовый поиск', measure(full_text, queries)))
+                return
+
+            recipe_search_index.invalidate()
+            self.timed('Построение индекса', recipe_search_index.get)
+
+            def in_memory(text):
+                return list(search_in_memory(recipes, text).values_list(
+                    'pk', flat=True)[:page_size])
+
+            try:
+                self.stdout.write(format_summary(
+                    'Индекс в памяти', measure(in_memory, queries)))
+            finally:
+                # Индекс построен по откатываемым данным.
+                recipe_search_index.invalidate()
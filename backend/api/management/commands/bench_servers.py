@@ -0,0 +1,125 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from api.benchmarks import endpoint_values, summary, synthetic_dataset
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+ENDPOINTS = (
+    '/api/tags/',
+    '/api/ingredients/?name={prefix}',
+    '/api/recipes/',
+    '/api/recipes/?tags={tag}',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/download_shopping_cart/',
+)
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность gunicorn с синхронными '
+        'воркерами и с воркерами uvicorn: запускает сервер в каждом '
+        'режиме и нагружает горячие GET-адреса параллельными запросами. '
+        'Нужны данные seed_synthetic в общей БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--existing', metavar='PREFIX',
+                            default='synthetic')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Всего запросов в каждом режиме.'
+        )
+        parser.add_argument('--mode', choices=MODES, action='append')
+
+    def handle(self, *args, **options):
+        dataset = synthetic_dataset(options['existing'])
+        if not dataset['users']:
+            raise CommandError(
+                f'Нет данных с префиксом {options["existing"]}: '
+                'запустите seed_synthetic.')
+        token, _ = Token.objects.get_or_create(user_id=dataset['users'][0])
+        values = endpoint_values(dataset)
+        paths = [
+            quote(endpoint.format(**values), safe='/?=&,')
+            for endpoint in ENDPOINTS
+        ]
+        base_url = f'http://127.0.0.1:{options["port"]}'
+        for mode in options['mode'] or MODES:
+            server = self.start_server(mode, options)
+            try:
+                self.wait_ready(base_url, server)
+                self.load(
+                    mode, base_url, paths, token.key,
+                    options['concurrency'], options['requests'])
+            finally:
+                server.terminate()
+                server.wait()
+
+    def start_server(self, mode, options):
+        env = dict(
+            os.environ,
+            SERVER_MODE=mode,
+            GUNICORN_BIND=f'127.0.0.1:{options["port"]}',
+            GUNICORN_WORKERS=str(options['workers']),
+        )
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config',
+             'gunicorn.conf.py', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR,
+            env=env
+        )
+
+    def wait_ready(self, base_url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Сервер завершился при запуске.')
+            try:
+                urlopen(f'{base_url}/api/tags/', timeout=5).read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('Сервер не ответил за отведённое время.')
+
+    def load(self, mode, base_url, paths, token, concurrency, requests):
+        def fetch(number):
+            request = Request(
+                base_url + paths[number % len(paths)],
+                headers={'Authorization': f'Token {token}'}
+            )
+            started = time.perf_counter()
+            try:
+                with urlopen(request, timeout=60) as response:
+                    response.read()
+            except OSError:
+                return None
+            return (time.perf_counter() - started) * 1000
+
+        for number in range(len(paths)):
+            fetch(number)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - started
+        durations = [result for result in results if result is not None]
+        if not durations:
+            raise CommandError(f'{mode}: все запросы завершились ошибкой.')
+        result = summary(durations)
+        self.stdout.write(
+            f'{mode}: {len(durations) / elapsed:.0f} запросов/с, '
+            f'p50={result["p50"]:.1f}ms p95={result["p95"]:.1f}ms '
+            f'p99={result["p99"]:.1f}ms, '
+            f'ошибок {len(results) - len(durations)}')
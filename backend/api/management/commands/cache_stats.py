@@ -0,0 +1,24 @@
+from api.cache import cache_stats, require_shared_cache, reset_cache_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Показывает счётчики попаданий и промахов кешей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        require_shared_cache('/api/cache-stats/')
+        for stats in cache_stats():
+            self.stdout.write(
+                f'{stats["title"]}: попаданий {stats["hits"]}, '
+                f'промахов {stats["misses"]}, '
+                f'доля попаданий {stats["ratio"]:.1f}%'
+            )
+        if options['reset']:
+            reset_cache_stats()
@@ -0,0 +1,54 @@
+import json
+
+from api.cache import require_shared_cache
+from django.core.management.base import BaseCommand
+from foodgram.profiling import get_report, reset_report
+
+
+class Command(BaseCommand):
+    help = 'Выводит статистику ProfilingMiddleware по эндпоинтам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести отчёт в JSON.'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить статистику после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        require_shared_cache('/api/profiling/')
+        report = get_report()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_table(report)
+        if options['reset']:
+            reset_report()
+
+    def write_table(self, report):
+        self.stdout.write(
+            f'{"endpoint":40} {"req":>6} {"queries":>8} {"db ms":>8} '
+            f'{"app ms":>8} {"render":>8} {"total":>8} {"max":>8} '
+            f'{"dup":>6}'
+        )
+        rows = sorted(
+            report.items(), key=lambda row: row[1]['total_ms'], reverse=True)
+        for name, stats in rows:
+            requests = stats['requests']
+            self.stdout.write(
+                f'{name:40} {requests:>6} '
+                f'{stats["queries"] / requests:>8.1f} '
+                f'{stats["db_ms"] / requests:>8.1f} '
+                f'{stats["app_ms"] / requests:>8.1f} '
+                f'{stats["render_ms"] / requests:>8.1f} '
+                f'{stats["total_ms"] / requests:>8.1f} '
+                f'{stats["max_total_ms"]:>8.1f} '
+                f'{stats["duplicate_queries"] / requests:>6.1f}'
+            )
+            for sql, count in stats['duplicates'].items():
+                self.stdout.write(f'    x{count}: {sql[:120]}')
@@ -0,0 +1,193 @@
+import json
+import random
+import time
+
+from api.benchmarks import (DUMMY_CACHES, create_synthetic_dataset,
+                            endpoint_values, require_sync_views, rolled_back,
+                            summary, synthetic_dataset)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import RecipeTrendingScore
+from rest_framework.authtoken.models import Token
+
+# Только чтение: запросы не меняют данные между повторами.
+ENDPOINTS = (
+    ('tags', '/api/tags/'),
+    ('ingredients', '/api/ingredients/?name={prefix}'),
+    ('ingredients-autocomplete',
+     '/api/ingredients/autocomplete/?name={prefix}'),
+    ('recipes', '/api/recipes/'),
+    ('recipes-cursor', '/api/recipes/?pagination=cursor'),
+    ('recipes-author', '/api/recipes/?author={author}'),
+    ('recipes-tags', '/api/recipes/?tags={tag}'),
+    ('recipes-favorited', '/api/recipes/?is_favorited=1'),
+    ('recipes-in-cart', '/api/recipes/?is_in_shopping_cart=1'),
+    ('recipes-popular', '/api/recipes/?ordering=popular'),
+    ('recipes-trending', '/api/recipes/?ordering=trending'),
+    ('recipes-search', '/api/recipes/?search={word}'),
+    ('recipes-cookable', '/api/recipes/cookable/?ingredients={ingredients}'),
+    ('recipes-feed', '/api/recipes/feed/'),
+    ('recipe', '/api/recipes/{recipe}/'),
+    ('shopping-cart-download', '/api/recipes/download_shopping_cart/'),
+    ('users', '/api/users/'),
+    ('user', '/api/users/{author}/'),
+    ('users-me', '/api/users/me/'),
+    ('subscriptions', '/api/users/subscriptions/'),
+)
+METRICS = ('p50', 'p95', 'p99', 'mean')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет запросы к API через тестовый клиент Django, считает '
+        'перцентили времени ответа и число SQL-запросов по каждому '
+        'адресу и сравнивает их с сохранённым эталоном: завершается '
+        'с ошибкой при регрессии. Синтетические данные откатываются. '
+        'Число запросов проверяют и тесты api (QueryPlansTest); команда '
+        'дополняет их замерами времени на объёмах, близких к боевым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--existing',
+            metavar='PREFIX',
+            help='Использовать данные, созданные seed_synthetic --prefix.'
+        )
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            help='Имя адреса из списка; по умолчанию - все.'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(settings.BASE_DIR / 'benchmark_baseline.json')
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать результаты как новый эталон.'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Допустимый относительный рост p95.'
+        )
+        parser.add_argument(
+            '--min-delta',
+            type=float,
+            default=1.0,
+            help='Рост p95 меньше этого числа миллисекунд - шум.'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Отключить кеш, чтобы замерять работу с БД.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        require_sync_views()
+        endpoints = [
+            (name, path) for name, path in ENDPOINTS
+            if not options['endpoint'] or name in options['endpoint']
+        ]
+        if not endpoints:
+            raise CommandError('Доступные адреса: {}.'.format(
+                ', '.join(name for name, _ in ENDPOINTS)))
+        caches = DUMMY_CACHES if options['no_cache'] else settings.CACHES
+        with rolled_back(), override_settings(CACHES=caches):
+            if options['existing']:
+                dataset = synthetic_dataset(options['existing'])
+                if not dataset['users']:
+                    raise CommandError(
+                        f'Нет данных с префиксом {options["existing"]}.')
+            else:
+                self.stdout.write('Наполнение БД...')
+                dataset = create_synthetic_dataset(
+                    random.Random(options['seed']), 'benchmark',
+                    options['users'], options['recipes'])
+                RecipeTrendingScore.objects.update_scores()
+            token, _ = Token.objects.get_or_create(user_id=dataset['users'][0])
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            values = endpoint_values(dataset)
+            results = {
+                name: self.run_endpoint(
+                    client, path.format(**values), options['requests'])
+                for name, path in endpoints
+            }
+        try:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            baseline = None
+        if options['save_baseline']:
+            # Замеры части адресов дополняют эталон, а не заменяют его.
+            baseline = {**(baseline or {}), **results}
+            with open(options['baseline'], 'w') as file:
+                json.dump(baseline, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталон записан в {options["baseline"]}.'))
+            return
+        if baseline is None:
+            self.stdout.write(
+                'Эталона нет, сравнение пропущено: запустите с '
+                '--save-baseline.')
+            return
+        regressions = self.compare(
+            results, baseline, options['tolerance'], options['min_delta'])
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}.')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def run_endpoint(self, client, path, requests):
+        # Первый запрос прогревает кеши и индексы в памяти процесса.
+        self.get(client, path)
+        durations = []
+        queries = []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                durations.append(self.get(client, path))
+            queries.append(len(captured))
+        result = summary(durations)
+        result = {metric: round(result[metric], 3) for metric in METRICS}
+        result['queries'] = max(queries)
+        self.stdout.write(
+            f'{path}: p50={result["p50"]:.2f}ms p95={result["p95"]:.2f}ms '
+            f'p99={result["p99"]:.2f}ms запросов={result["queries"]}')
+        return result
+
+    def get(self, client, path):
+        started = time.perf_counter()
+        response = client.get(path)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: ответ {response.status_code}')
+        return (time.perf_counter() - started) * 1000
+
+    def compare(self, results, baseline, tolerance, min_delta):
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                self.stdout.write(f'{name}: нет в эталоне.')
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(name)
+                self.stderr.write(
+                    f'{name}: запросов {result["queries"]}, '
+                    f'в эталоне {expected["queries"]}')
+            if (result['p95'] > expected['p95'] * (1 + tolerance)
+                    and result['p95'] - expected['p95'] > min_delta):
+                regressions.append(name)
+                self.stderr.write(
+                    f'{name}: p95 {result["p95"]:.2f}ms, '
+                    f'в эталоне {expected["p95"]:.2f}ms')
+        return regressions
@@ -0,0 +1,70 @@
+import random
+
+from api.benchmarks import create_synthetic_dataset, timed
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет БД синтетическими пользователями, тегами, '
+        'ингредиентами, рецептами, избранным, списками покупок '
+        'и подписками массовыми вставками. Данные остаются в БД: '
+        'на них можно запускать run_benchmarks --existing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--min-per-recipe', type=int, default=3)
+        parser.add_argument('--max-per-recipe', type=int, default=12)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Рецептов в избранном у каждого пользователя.'
+        )
+        parser.add_argument(
+            '--carts',
+            type=int,
+            default=5,
+            help='Рецептов в списке покупок у каждого пользователя.'
+        )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Подписок у каждого пользователя.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Данные с префиксом {prefix} уже есть, укажите другой '
+                '--prefix.')
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        with transaction.atomic():
+            dataset, duration = timed(lambda: create_synthetic_dataset(
+                random.Random(options['seed']), prefix, options['users'],
+                options['recipes'],
+                ingredients=options['ingredients'],
+                per_recipe=(
+                    options['min_per_recipe'], options['max_per_recipe']),
+                tags=options['tags'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows']
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(dataset["users"])}, рецептов: '
+            f'{dataset["recipes"].count()}, тегов: {len(dataset["tags"])} '
+            f'за {duration / 1000:.1f}s.'))
@@ -0,0 +1,85 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+from .cache import counter_key, incr_counter
+
+# Вид членства -> модель и поле с id объекта.
+KINDS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'carts': (ShoppingCart, 'recipe_id'),
+    'follows': (Follow, 'author_id'),
+}
+RECIPE_KINDS = {Favorite: 'favorites', ShoppingCart: 'carts'}
+
+
+def generation_counter(kind, user_id):
+    return f'memberships:{kind}:{user_id}'
+
+
+def membership_key(kind, user_id, generation):
+    return f'memberships:{kind}:{user_id}:{generation}'
+
+
+def load_memberships(user_id):
+    """
+    Рецепты в избранном и списке покупок и авторы в подписках
+    пользователя: {вид: frozenset id}. В кеше id хранятся отсортированным
+    массивом int64 под номером поколения, который меняет каждое
+    изменение. Набор, прочитанный до изменения, записывается под
+    старым номером и больше не читается. Недостающие виды читаются
+    из основной БД: набор с отстающей реплики попал бы под новый номер.
+    """
+    counters = {
+        kind: counter_key(generation_counter(kind, user_id))
+        for kind in KINDS
+    }
+    generations = cache.get_many(counters.values())
+    keys = {
+        kind: membership_key(
+            kind, user_id, generations.get(counters[kind], 0))
+        for kind in KINDS
+    }
+    cached = cache.get_many(keys.values())
+    memberships = {}
+    missing = {}
+    for kind, key in keys.items():
+        if key in cached:
+            memberships[kind] = frozenset(cached[key])
+            continue
+        model, field = KINDS[kind]
+        ids = array('q', sorted(model.objects.using(
+            DEFAULT_DB_ALIAS).filter(user=user_id).values_list(
+                field, flat=True)))
+        missing[key] = ids
+        memberships[kind] = frozenset(ids)
+    if missing:
+        cache.set_many(missing, settings.MEMBERSHIP_CACHE_TTL)
+    return memberships
+
+
+def is_member(request, kind, pk):
+    """Флаг текущего пользователя; данные читаются один раз за запрос."""
+    if request is None or request.user.is_anonymous:
+        return False
+    if not hasattr(request, 'memberships'):
+        request.memberships = load_memberships(request.user.pk)
+    return pk in request.memberships[kind]
+
+
+def update_memberships(user_id, kind, added=(), removed=()):
+    """
+    Меняет поколение закешированных id после коммита изменения;
+    следующее чтение загрузит их из БД. Удаление ключа не годится:
+    запрос, прочитавший БД до коммита, записал бы старый набор обратно.
+    Правка списка на месте тоже: get и set не атомарны, и одновременные
+    изменения теряли бы друг друга.
+    """
+    if not added and not removed:
+        return
+    counter = generation_counter(kind, user_id)
+    transaction.on_commit(lambda: incr_counter(counter))
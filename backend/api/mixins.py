@@ -1,6 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
+
+from .cache import cache_catalog_data, catalog_response_key, catalog_state
 
 
 class ListRetrieveMixin(mixins.ListModelMixin,
                         mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     pass
+
+
+class CachedListRetrieveMixin(ListRetrieveMixin):
+    """
+    Справочник с ETag/Last-Modified, ответами 304 и серверным кешем.
+    Версия справочника хранится в БД и меняется сигналами при изменении
+    модели и командой load_ingredients.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        model = self.get_queryset().model
+        version, modified = catalog_state(model)
+        etag = quote_etag(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+        if response is None:
+            key = catalog_response_key(model, version, request)
+            data = cache.get(key)
+            if data is None:
+                data = handler(request, *args, **kwargs).data
+                cache_catalog_data(key, data)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+        return response
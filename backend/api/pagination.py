@@ -1,6 +1,96 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework import exceptions
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def approximate_count(queryset):
+    """
+    Оценка количества строк из статистики PostgreSQL для таблицы
+    без фильтров; в остальных случаях - точный COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return queryset.count()
+
+
+class KeysetPaginator(CursorPagination):
+    """
+    Пагинация по курсору (id последнего объекта страницы) без OFFSET.
+    Общее количество считается только по запросу: ?count=exact
+    или ?count=approximate.
+    """
+
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'approximate':
+            self.count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+            response.data.move_to_end('count', last=False)
+        return response
 
 
 class CustomPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация; с параметром cursor или ?pagination=cursor
+    переключается на KeysetPaginator с порядком view.cursor_ordering.
+    Курсор хранит позицию только в этом порядке, поэтому запрос
+    с другой сортировкой (?ordering=, порядок по рангу поиска)
+    отклоняется, а не молча пересортировывается. Готовые списки
+    всегда разбиваются на страницы по номеру.
+    """
+
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if isinstance(queryset, QuerySet) and self.use_cursor(request):
+            self.keyset = KeysetPaginator(
+                getattr(view, 'cursor_ordering', None))
+            requested = list(queryset.query.order_by)
+            if requested and requested != [self.keyset.ordering]:
+                raise exceptions.ValidationError({
+                    'pagination': 'Курсор работает только с порядком '
+                                  'по умолчанию: для сортировки и поиска '
+                                  'используйте пагинацию по страницам.'
+                })
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,194 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery, Value,
+                              When)
+from recipes.models import Recipe, RecipeIngredient
+
+from .cache import LazyIndex
+
+TOKEN = re.compile(r'\w+')
+# Грубая замена стеммера PostgreSQL: отбрасываются частые окончания,
+# чтобы «борща» и «борщ» давали одно слово.
+ENDINGS = re.compile(
+    r'(ами|ями|ого|его|ому|ему|ой|ей|ий|ый|ая|яя|ое|ее|ые|ие|ом|ем|'
+    r'ах|ях|ов|ев|а|я|ы|и|у|ю|е|о|ь)$'
+)
+# Веса полей как у ts_rank по умолчанию: название - A, ингредиенты - B,
+# описание - C.
+WEIGHTS = (('name', 1.0), ('ingredients', 0.4), ('text', 0.2))
+
+
+def stem(word):
+    stemmed = ENDINGS.sub('', word)
+    return stemmed if len(stemmed) >= 3 else word
+
+
+def tokenize(text):
+    return [
+        stem(word) for word in TOKEN.findall(text.casefold().replace('ё', 'е'))
+    ]
+
+
+def uses_postgresql():
+    return connections[Recipe.objects.db].vendor == 'postgresql'
+
+
+def search_vector():
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredient_names = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredient_names), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+class RecipeSearchIndex:
+    """
+    Обратный индекс в памяти процесса: слово -> {id рецепта: вес}.
+    Слова запроса ищутся как префиксы по отсортированному списку слов,
+    чтобы «борщ» находил и «борща». Рецепт должен содержать все слова.
+    """
+
+    def __init__(self, documents=()):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.words = None
+        for document in documents:
+            self.add(*document)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, pk, name, ingredients, text):
+        self.remove(pk)
+        weights = defaultdict(float)
+        for value, (_, weight) in zip((name, ingredients, text), WEIGHTS):
+            for word in tokenize(value):
+                weights[word] += weight
+        for word, weight in weights.items():
+            if word not in self.postings:
+                self.words = None
+            self.postings[word][pk] = weight
+        self.documents[pk] = tuple(weights)
+
+    def remove(self, pk):
+        for word in self.documents.pop(pk, ()):
+            self.postings[word].pop(pk, None)
+
+    def expand(self, token):
+        if self.words is None:
+            self.words = sorted(self.postings)
+        position = bisect_left(self.words, token)
+        while (position < len(self.words)
+               and self.words[position].startswith(token)):
+            yield self.words[position]
+            position += 1
+
+    def search(self, text, limit=None):
+        """[(id, ранг)] по убыванию ранга, затем id."""
+        scores = None
+        for token in set(tokenize(text)):
+            matched = defaultdict(float)
+            for word in self.expand(token):
+                for pk, weight in self.postings[word].items():
+                    if scores is None or pk in scores:
+                        matched[pk] += weight
+            if scores is not None:
+                for pk in matched:
+                    matched[pk] += scores[pk]
+            scores = matched
+            if not scores:
+                break
+        if not scores:
+            return []
+        return sorted(
+            scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+
+def recipe_documents(queryset):
+    ingredients = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.filter(
+        recipe__in=queryset
+    ).values_list('recipe_id', 'ingredient__name').iterator():
+        ingredients[recipe_id].append(name)
+    for pk, name, text in queryset.values_list('pk', 'name', 'text'):
+        yield pk, name, ' '.join(ingredients[pk]), text
+
+
+class LazyRecipeSearchIndex(LazyIndex):
+    ttl_setting = 'RECIPE_SEARCH_INDEX_TTL'
+
+    def build(self):
+        return RecipeSearchIndex(recipe_documents(Recipe.objects.all()))
+
+    def refresh(self, index, ids):
+        for pk in ids:
+            index.remove(pk)
+        for document in recipe_documents(Recipe.objects.filter(pk__in=ids)):
+            index.add(*document)
+
+
+recipe_search_index = LazyRecipeSearchIndex()
+
+
+def update_search_vectors(ids):
+    """Пересчитывает поисковые данные рецептов после их изменения."""
+    if uses_postgresql():
+        Recipe.objects.filter(pk__in=ids).update(
+            search_vector=search_vector())
+    else:
+        recipe_search_index.update(ids)
+
+
+def search_in_database(queryset, text):
+    query = SearchQuery(
+        text, config=settings.RECIPE_SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-id')
+
+
+def search_in_memory(queryset, text):
+    """
+    Индекс ничего не знает о фильтрах queryset, поэтому найденное
+    проверяется по queryset пачками в порядке ранга, пока не наберётся
+    RECIPE_SEARCH_MAX_RESULTS подходящих рецептов.
+    """
+    limit = settings.RECIPE_SEARCH_MAX_RESULTS
+    ranked = recipe_search_index.get().search(text)
+    found = []
+    for start in range(0, len(ranked), limit):
+        batch = ranked[start:start + limit]
+        matching = set(queryset.filter(
+            pk__in=[pk for pk, _ in batch]).values_list('pk', flat=True))
+        found += [(pk, rank) for pk, rank in batch if pk in matching]
+        if len(found) >= limit:
+            break
+    found = found[:limit]
+    if not found:
+        return queryset.none()
+    return queryset.filter(pk__in=[pk for pk, _ in found]).annotate(
+        rank=Case(
+            *(When(pk=pk, then=Value(rank)) for pk, rank in found),
+            output_field=FloatField()
+        )
+    ).order_by('-rank', '-id')
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    if uses_postgresql():
+        return search_in_database(queryset, text)
+    return search_in_memory(queryset, text)
@@ -1,12 +1,21 @@
+import hashlib
+import os
+from collections import OrderedDict
+
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.db.models import (Manager, OuterRef, Prefetch, Subquery,
+                              prefetch_related_objects)
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.images import (image_storage, known_variants,
+                            schedule_recipe_image)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import exceptions, serializers
-from users.models import Follow
+
+from .cache import get_recipe_payloads, set_recipe_payloads
+from .constants import SUBSCRIPTION_RECIPES_LIMIT
+from .memberships import is_member
 
 User = get_user_model()
 
@@ -25,10 +34,7 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=request.user, author=obj.id).exists()
+        return is_member(self.context.get('request'), 'follows', obj.id)
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -83,48 +89,177 @@ class GetIngredientRecipeSerializer(serializers.ModelSerializer):
         return obj.amount
 
 
-class GetRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор Recipe для чтения."""
+class ImageVariantsField(serializers.Field):
+    """
+    Ссылки на уменьшенные копии картинки рецепта для srcset:
+    {"webp": {"320w": url, ...}, "jpeg": {...}}.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        storage = image_storage()
+        return {
+            image_format: {
+                f'{width}w': storage.url(name)
+                for width, name in sizes.items()
+            }
+            for image_format, sizes in variants.items()
+        }
+
+
+class StoredImageField(serializers.ImageField):
+    """
+    Если файл с таким же содержимым уже лежит в контентно-адресуемом
+    хранилище, возвращает его имя без проверки Pillow и без записи.
+    """
+
+    def to_internal_value(self, data):
+        field = Recipe._meta.get_field('image')
+        digest, extension = os.path.splitext(data.name)
+        name = field.storage.hashed_name(field.upload_to, digest, extension)
+        if field.storage.exists(name):
+            field.storage.touch(name)
+            return name
+        return super().to_internal_value(data)
+
+
+class HashedBase64ImageField(Base64ImageField, StoredImageField):
+    """Base64ImageField, который называет файл по sha256 содержимого."""
+
+    def get_file_name(self, decoded_file):
+        return hashlib.sha256(decoded_file).hexdigest()
+
+
+def absolute_image_variants(request, variants):
+    return {
+        image_format: {
+            width: request.build_absolute_uri(url)
+            for width, url in urls.items()
+        }
+        for image_format, urls in variants.items()
+    }
+
+
+class AuthorSerializer(UserSerializer):
+    """Данные автора рецепта, не зависящие от пользователя."""
+
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
+class RecipePayloadSerializer(serializers.ModelSerializer):
+    """Часть рецепта, одинаковая для всех пользователей. Кешируется."""
 
     tags = TagSerializer(read_only=True, many=True)
-    author = CustomUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField(read_only=True)
+    author = AuthorSerializer(read_only=True)
+    ingredients = GetIngredientRecipeSerializer(
+        source='recipeingredients', read_only=True, many=True)
+    image_variants = ImageVariantsField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients', 'name', 'image',
+                  'image_variants', 'text', 'cooking_time')
+
+
+def recipe_payloads(recipes):
+    """Данные рецептов из кеша; промахи считаются одним prefetch."""
+    payloads = get_recipe_payloads(recipes)
+    missing = [recipe for recipe in recipes if recipe.pk not in payloads]
+    if missing:
+        prefetch_related_objects(
+            missing,
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        computed = {
+            recipe.pk: RecipePayloadSerializer(recipe).data
+            for recipe in missing
+        }
+        set_recipe_payloads(missing, computed)
+        payloads.update(computed)
+    return payloads
+
+
+class GetRecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        payloads = recipe_payloads(recipes)
+        return [
+            self.child.merge(recipe, payloads[recipe.pk])
+            for recipe in recipes
+        ]
+
+
+class GetRecipeSerializer(RecipePayloadSerializer):
+    """
+    Сериализатор Recipe для чтения: данные из кеша
+    плюс флаги текущего пользователя.
+    """
+
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
+        list_serializer_class = GetRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.merge(instance, recipe_payloads([instance])[instance.pk])
+
+    def merge(self, instance, payload):
+        data = OrderedDict(
+            (field, payload.get(field)) for field in self.Meta.fields)
+        data['author'] = OrderedDict(
+            payload['author'], is_subscribed=self.get_is_subscribed(instance))
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        request = self.context.get('request')
+        if request and data['image']:
+            data['image'] = request.build_absolute_uri(data['image'])
+        if request:
+            data['image_variants'] = absolute_image_variants(
+                request, data['image_variants'])
+        return data
+
+    def get_is_subscribed(self, obj):
+        return is_member(
+            self.context.get('request'), 'follows', obj.author_id)
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            user=request.user, recipe=obj.id).exists()
+        return is_member(self.context.get('request'), 'favorites', obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe=obj.id).exists()
-
-    def get_ingredients(self, obj):
-        recipe = obj
-        ingredients = RecipeIngredient.objects.filter(recipe=recipe)
-        serializer = GetIngredientRecipeSerializer(ingredients, many=True)
-        return serializer.data
+        return is_member(self.context.get('request'), 'carts', obj.id)
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор модели Recipe для добавления в Favorite и ShoppingCart."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        if request:
+            data['image_variants'] = absolute_image_variants(
+                request, data['image_variants'])
+        return data
 
 
 class ShortIngredientSerializerForRecipe(serializers.ModelSerializer):
@@ -147,7 +282,7 @@ class PostRecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     ingredients = ShortIngredientSerializerForRecipe(many=True)
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
     cooking_time = serializers.IntegerField()
 
     def validate_tags(self, tags):
@@ -160,10 +295,15 @@ class PostRecipeSerializer(serializers.ModelSerializer):
             raise exceptions.ValidationError(
                 'Должен быть хотя бы один ингредиент.')
 
-        if len(ingredients) != len(set(ingredient['id']
-                                       for ingredient in ingredients)):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ids) != len(set(ids)):
             raise exceptions.ValidationError(
                 'У рецепка не может быть два одинаковых игредиента.')
+        missing = set(ids) - Ingredient.objects.in_bulk(ids).keys()
+        if missing:
+            raise exceptions.ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.')
         return ingredients
 
     def validate_cooking_time(self, cooking_time):
@@ -172,48 +312,85 @@ class PostRecipeSerializer(serializers.ModelSerializer):
                 'Минимальное время приготовления 1 минута.')
         return cooking_time
 
-    def get_ingredients(self, ingredients):
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            ingredient_instance = ingredient['id']
-
-            yield amount, get_object_or_404(Ingredient, pk=ingredient_instance)
+    def image_variants(self, image):
+        # Уже сохранённая картинка приходит строкой с именем файла.
+        if isinstance(image, str):
+            return known_variants(image)
+        return {}
 
     @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(author=author, **validated_data)
+        recipe = Recipe.objects.create(
+            author=author,
+            image_variants=self.image_variants(validated_data['image']),
+            **validated_data
+        )
         recipe.tags.set(tags)
-        recipe_ingredients = []
-        for amount, ingredient in self.get_ingredients(ingredients):
-            recipe_ingredients.append(RecipeIngredient(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
-            ))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients
+        )
+        schedule_recipe_image(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-
-        for amount, ingredient in self.get_ingredients(validated_data.
-                                                       pop('ingredients')):
-            RecipeIngredient.objects.update_or_create(
-                recipe=instance,
-                ingredient=ingredient,
-                amount=amount
-            )
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            RecipeIngredient.objects.replace(instance, {
+                ingredient['id']: ingredient['amount']
+                for ingredient in ingredients
+            })
+        if 'image' not in validated_data:
+            return super().update(instance, validated_data)
+        validated_data['image_variants'] = self.image_variants(
+            validated_data['image'])
+        recipe = super().update(instance, validated_data)
+        schedule_recipe_image(recipe)
+        return recipe
 
     class Meta:
         model = Recipe
         fields = '__all__'
+        read_only_fields = ('image_variants', 'favorites_count',
+                            'in_carts_count')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или лимит по умолчанию."""
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (AttributeError, KeyError, ValueError):
+        return SUBSCRIPTION_RECIPES_LIMIT
+
+
+def recent_recipes(limit):
+    """
+    Последние limit рецептов каждого автора одним запросом
+    для Prefetch('recipes', ...).
+    """
+    return Recipe.objects.filter(pk__in=Subquery(
+        Recipe.objects.filter(author=OuterRef('author'))
+        .order_by('-id').values('pk')[:limit]
+    ))
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -224,18 +401,25 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
 
     def get_is_subscribed(self, obj):
         return True
 
     def get_recipes(self, object):
-        queryset = object.recipes.all()[:3]
+        if hasattr(object, 'recent_recipes'):
+            queryset = object.recent_recipes
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            queryset = object.recipes.all()[:limit]
 
-        return ShortRecipeSerializer(queryset, many=True).data
+        return ShortRecipeSerializer(
+            queryset, many=True, context=self.context).data
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed',
-                  'recipes', "recipes", 'recipes_count')
+                  'recipes', 'recipes_count')
@@ -0,0 +1,201 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Follow
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .autocomplete import ingredient_index
+from .cache import touch_catalog
+from .cookable import cookable_index
+from .memberships import RECIPE_KINDS, update_memberships
+from .search import update_search_vectors
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'id', 'email', 'username', 'first_name', 'last_name'}
+LOGIN_FIELDS = {'last_login'}
+INDEXED_FIELDS = {'name', 'text'}
+
+
+def reindex_recipes(ids):
+    update_search_vectors(ids)
+    cookable_index.update(ids)
+
+
+def reindex_recipes_on_commit(ids):
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: reindex_recipes(ids))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+    touch_catalog(Ingredient)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if created:
+        return
+    ids = list(RecipeIngredient.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
+    if ids:
+        Recipe.objects.touch(ids)
+        transaction.on_commit(lambda: update_search_vectors(ids))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tag_changed(instance, **kwargs):
+    # Связи с рецептами удаляются вместе с тегом без сигнала m2m_changed,
+    # поэтому рецепты отмечаются до удаления.
+    touch_catalog(Tag)
+    Recipe.objects.touch(Recipe.objects.filter(tags=instance).values('pk'))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(instance, update_fields=None, **kwargs):
+    if update_fields and not INDEXED_FIELDS & set(update_fields):
+        return
+    reindex_recipes_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        FeedItem.objects.fan_out(instance)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    Recipe.objects.touch([instance.recipe_id])
+    reindex_recipes_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.change_counter(
+            sender.counter_field, [instance.recipe_id], 1)
+        update_memberships(
+            instance.user_id, RECIPE_KINDS[sender],
+            added=[instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_removed(sender, instance, **kwargs):
+    Recipe.objects.change_counter(
+        sender.counter_field, [instance.recipe_id], -1)
+    update_memberships(
+        instance.user_id, RECIPE_KINDS[sender], removed=[instance.recipe_id])
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_previous(sender, instance, **kwargs):
+    # Для правки списков покупок нужна строка в том виде, в каком
+    # она лежит в БД до сохранения.
+    instance.previous = None
+    if instance.pk is not None:
+        instance.previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_saved(instance, **kwargs):
+    previous = instance.previous
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+                instance.user_id, instance.recipe_id):
+            return
+        ShoppingListItem.objects.remove_recipes(
+            previous.user_id, [previous.recipe_id])
+    ShoppingListItem.objects.add_recipes(
+        instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(instance, **kwargs):
+    ShoppingListItem.objects.remove_recipes(
+        instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, **kwargs):
+    changes = {
+        instance.recipe_id: Counter({instance.ingredient_id: instance.amount})
+    }
+    previous = instance.previous
+    if previous is not None:
+        changes.setdefault(previous.recipe_id, Counter())[
+            previous.ingredient_id] -= previous.amount
+    for recipe_id, recipe_changes in changes.items():
+        ShoppingListItem.objects.change_recipe(recipe_id, recipe_changes)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, **kwargs):
+    # При удалении рецепта каскадом удаляются и его корзины: какая бы
+    # из двух таблиц ни очистилась первой, ингредиенты вычтутся один раз.
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            Recipe.objects.touch([instance.pk])
+    elif action == 'pre_clear':
+        Recipe.objects.touch(
+            Recipe.objects.filter(tags=instance).values('pk'))
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.touch(pk_set)
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, update_fields, **kwargs):
+    if update_fields and not AUTHOR_FIELDS & set(update_fields):
+        return
+    Recipe.objects.touch(instance.recipes.values('pk'))
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields, **kwargs):
+    # Пароль, is_active и остальные поля пользователя лежат в кеше
+    # токенов вместе с ним.
+    if update_fields and set(update_fields) <= LOGIN_FIELDS:
+        return
+    invalidate_user_tokens([instance.pk])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    # После удаления Django обнуляет первичный ключ экземпляра, а ключ
+    # токена и есть первичный ключ: он запоминается сейчас.
+    keys = [instance.key]
+    transaction.on_commit(lambda: invalidate_tokens(keys))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    if created:
+        FeedItem.objects.follow(instance.user_id, instance.author_id)
+        update_memberships(
+            instance.user_id, 'follows', added=[instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    FeedItem.objects.unfollow(instance.user_id, instance.author_id)
+    update_memberships(
+        instance.user_id, 'follows', removed=[instance.author_id])
@@ -0,0 +1,877 @@
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from array import array
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from foodgram.db import replica_alias
+from foodgram.pooled_postgresql.base import DatabaseWrapper
+from foodgram.profiling import get_report, reset_report
+from recipes.images import image_storage
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTrendingScore,
+                            ShoppingCart, ShoppingListItem, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+from .authentication import invalidate_user_tokens, local_tokens
+from .benchmarks import (DUMMY_CACHES, create_synthetic_dataset,
+                         endpoint_values)
+from .cache import catalog_state
+from .memberships import load_memberships, membership_key
+from .search import recipe_search_index
+
+
+@override_settings(CACHES=DUMMY_CACHES, ASYNC_VIEWS=False)
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=10, recipes=120,
+            ingredients=50, per_recipe=(3, 6)
+        )
+        cls.user = dataset['recipes'].first().author
+
+    def assert_constant_queries(self, client, count):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(count):
+                    response = client.get(
+                        '/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient(), 4)
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant_queries(client, 7)
+
+
+# Второй элемент - можно ли читать всю таблицу для COUNT(*) постраничной
+# пагинации: без фильтров это неизбежно при любых индексах. Третий -
+# число SQL-запросов; у поиска оно зависит от СУБД и не проверяется.
+ENDPOINTS = (
+    ('/api/recipes/', True, 7),
+    ('/api/recipes/?pagination=cursor', False, 6),
+    ('/api/recipes/?author={author}', False, 8),
+    ('/api/recipes/?tags={tag}', False, 8),
+    ('/api/recipes/?is_favorited=1', False, 7),
+    ('/api/recipes/?is_in_shopping_cart=1', False, 7),
+    ('/api/recipes/?ordering=popular', True, 7),
+    ('/api/recipes/?ordering=trending', True, 7),
+    ('/api/recipes/?search={word}', False, None),
+    ('/api/recipes/{recipe}/', False, 6),
+    ('/api/recipes/feed/', False, 7),
+    ('/api/recipes/download_shopping_cart/', False, 1),
+    ('/api/users/subscriptions/', False, 3),
+    ('/api/users/{author}/', False, 4),
+    ('/api/ingredients/?name={prefix}', False, 2),
+)
+SQLITE_ALIAS = re.compile(r'"(\w+)" (U\d+|T\d+)')
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+# SQLite показывает обход по rowid как SCAN, даже если ORDER BY id
+# с LIMIT останавливает его после первых строк.
+SQLITE_LIMIT = re.compile(r' LIMIT \d+$')
+
+
+def scanned_tables(sql):
+    """Таблицы, которые план запроса читает целиком."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return list(seq_scans(plan[0]['Plan']))
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+    if SQLITE_LIMIT.search(sql) and not any(
+            detail.startswith('USE TEMP B-TREE') for detail in details):
+        return []
+    aliases = dict(
+        (alias, table) for table, alias in SQLITE_ALIAS.findall(sql))
+    return [
+        aliases.get(match.group(1), match.group(1))
+        for match in map(SQLITE_SCAN.match, details) if match
+    ]
+
+
+def seq_scans(node):
+    if node['Node Type'] == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+@override_settings(CACHES=DUMMY_CACHES, ASYNC_VIEWS=False)
+class QueryPlansTest(TestCase):
+    """
+    Основные запросы API не читают большие таблицы целиком, а число
+    запросов не меняется. Таблицы меньше min_rows не проверяются.
+    """
+
+    min_rows = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'plan-check', users=100, recipes=1000,
+            ingredients=300, tags=10
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = User.objects.get(pk=dataset['users'][0])
+        cls.values = endpoint_values(dataset)
+
+    def setUp(self):
+        recipe_search_index.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        recipe_search_index.invalidate()
+
+    def get(self, path):
+        response = self.client.get(path)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def large_tables(self):
+        tables = set()
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                if cursor.fetchone()[0] >= self.min_rows:
+                    tables.add(table)
+        return tables
+
+    def test_endpoints(self):
+        large_tables = self.large_tables()
+        for endpoint, full_count, count in ENDPOINTS:
+            path = endpoint.format(**self.values)
+            with self.subTest(path=path):
+                # Первый запрос строит индексы в памяти процесса, а они
+                # читают таблицы целиком один раз, а не на каждый запрос.
+                self.get(path)
+                with CaptureQueriesContext(connection) as queries:
+                    self.get(path)
+                if count is not None:
+                    self.assertEqual(len(queries), count)
+                for query in queries.captured_queries:
+                    sql = query['sql']
+                    if not sql.startswith('SELECT') or (
+                            full_count and sql.startswith('SELECT COUNT(*)')):
+                        continue
+                    self.assertFalse(
+                        large_tables & set(scanned_tables(sql)), sql)
+
+
+class ShoppingListTest(TestCase):
+    """Списки покупок следуют за изменениями корзин и рецептов в ORM."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=5, recipes=20,
+            ingredients=30, per_recipe=(2, 4), carts=3
+        )
+        cls.recipes = dataset['recipes']
+        cls.user_id = dataset['users'][0]
+
+    def assert_consistent(self):
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingListItem.objects.all()
+            },
+            ShoppingListItem.objects.expected()
+        )
+
+    def test_cart(self):
+        recipe = self.recipes.exclude(carts__user=self.user_id).first()
+        cart = ShoppingCart.objects.create(
+            user_id=self.user_id, recipe=recipe)
+        self.assert_consistent()
+        cart.recipe = self.recipes.exclude(carts__user=self.user_id).first()
+        cart.save()
+        self.assert_consistent()
+        cart.delete()
+        self.assert_consistent()
+
+    def test_recipe_ingredients(self):
+        recipe = self.recipes.filter(carts__isnull=False).first()
+        recipe_ingredient = recipe.recipeingredients.first()
+        recipe_ingredient.amount += 5
+        recipe_ingredient.save()
+        self.assert_consistent()
+        RecipeIngredient.objects.create(
+            recipe=recipe, amount=7, ingredient=Ingredient.objects.exclude(
+                recipeingredients__recipe=recipe).first())
+        self.assert_consistent()
+        recipe_ingredient.delete()
+        self.assert_consistent()
+        RecipeIngredient.objects.replace(recipe, {
+            ingredient_id: 3 for ingredient_id in Ingredient.objects.exclude(
+                recipeingredients__recipe=recipe).values_list(
+                    'pk', flat=True)[:2]
+        })
+        self.assert_consistent()
+
+    def test_concurrent_item(self):
+        # Позицию успела создать другая транзакция: количество
+        # прибавляется к ней, а не падает на уникальности.
+        user_id, ingredient_id = self.user_id, Ingredient.objects.first().pk
+        ShoppingListItem.objects.filter(user=user_id).delete()
+        ShoppingListItem.objects.create(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=2)
+        ShoppingListItem.objects.apply_changes(
+            [user_id], {ingredient_id: 3})
+        ShoppingListItem.objects.apply_changes(
+            [user_id], {ingredient_id: -5})
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=user_id).exists())
+
+    def test_recipe_deleted(self):
+        self.recipes.filter(carts__isnull=False).first().delete()
+        self.assert_consistent()
+
+
+class CursorPaginationTest(TestCase):
+    """Курсор не подменяет запрошенный порядок своим."""
+
+    @classmethod
+    def setUpTestData(cls):
+        recipes = create_synthetic_dataset(
+            random.Random(0), 'test', users=3, recipes=10, ingredients=10,
+            per_recipe=(1, 2), favorites=3
+        )['recipes']
+        cls.word = recipes.first().name.split()[0]
+
+    def setUp(self):
+        recipe_search_index.invalidate()
+
+    def tearDown(self):
+        recipe_search_index.invalidate()
+
+    def test_default_ordering(self):
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 4})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), 8)
+
+    def test_other_ordering(self):
+        for params in ({'ordering': 'popular'}, {'search': self.word}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    '/api/recipes/', {**params, 'pagination': 'cursor'})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class RecipeIngredientsReplaceTest(TestCase):
+    """Число запросов замены состава не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=3, recipes=1, ingredients=100,
+            per_recipe=(1, 1), carts=1
+        )
+        cls.recipe = dataset['recipes'].get()
+        cls.ingredients = list(Ingredient.objects.exclude(
+            recipeingredients__recipe=cls.recipe).values_list(
+                'pk', flat=True))
+
+    def replace(self, count):
+        client = APIClient()
+        client.force_authenticate(self.recipe.author)
+        ingredients, self.ingredients = (
+            self.ingredients[:count], self.ingredients[count:])
+        response = client.patch(
+            f'/api/recipes/{self.recipe.pk}/', {
+                'ingredients': [{'id': pk, 'amount': 2} for pk in ingredients]
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(self.recipe.recipeingredients.values_list(
+                'ingredient', flat=True)),
+            set(ingredients)
+        )
+
+    def test_constant_queries(self):
+        self.replace(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.replace(10)
+        with self.assertNumQueries(len(queries)):
+            self.replace(40)
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingListItem.objects.all()
+            },
+            ShoppingListItem.objects.expected()
+        )
+
+
+class RecipeTogglesTest(TestCase):
+    """Избранное и корзина: повторы отклоняются, счётчики сходятся."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=2, recipes=6, ingredients=20,
+            per_recipe=(2, 4), favorites=0, carts=0, follows=0
+        )
+        cls.recipes = list(dataset['recipes'].values_list('pk', flat=True))
+        cls.user = User.objects.get(pk=dataset['users'][0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_consistent(self, model, recipe_ids):
+        self.assertEqual(
+            set(model.objects.filter(user=self.user).values_list(
+                'recipe', flat=True)),
+            set(recipe_ids)
+        )
+        counts = Recipe.objects.actual_counts()
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk').values_list(
+                model.counter_field, flat=True)),
+            list(Recipe.objects.order_by('pk').annotate(
+                actual=counts[model.counter_field]).values_list(
+                    'actual', flat=True))
+        )
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingListItem.objects.all()
+            },
+            ShoppingListItem.objects.expected()
+        )
+
+    def test_single(self):
+        recipe_id = self.recipes[0]
+        for model, path in ((Favorite, 'favorite'),
+                            (ShoppingCart, 'shopping_cart')):
+            with self.subTest(path=path):
+                url = f'/api/recipes/{recipe_id}/{path}/'
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assert_consistent(model, [recipe_id])
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assert_consistent(model, [])
+
+    def test_bulk(self):
+        first, second, third, *_ = self.recipes
+        for model, path in ((Favorite, 'favorite'),
+                            (ShoppingCart, 'shopping_cart')):
+            with self.subTest(path=path):
+                url = f'/api/recipes/{path}/bulk/'
+                self.client.post(f'/api/recipes/{first}/{path}/')
+                response = self.client.post(
+                    url, {'ids': [first, second, second]}, format='json')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.data], [second])
+                self.assert_consistent(model, [first, second])
+                response = self.client.delete(
+                    url, {'ids': [second, third]}, format='json')
+                self.assertEqual(response.status_code, 204)
+                self.assert_consistent(model, [first])
+                response = self.client.post(
+                    url, {'ids': [third, max(self.recipes) + 1]},
+                    format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assert_consistent(model, [first])
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=3)
+class FeedTest(TestCase):
+    """Лента одинакова выше и ниже порога раскладки по FeedItem."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=10, recipes=20, ingredients=10,
+            per_recipe=(1, 2), favorites=0, carts=0, follows=0
+        )
+        cls.users = list(User.objects.filter(pk__in=dataset['users']))
+        cls.authors = list(
+            User.objects.filter(recipes__isnull=False).distinct())
+
+    def subscribe(self, user, author, method='post'):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = getattr(client, method)(
+            f'/api/users/{author.pk}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def assert_feed(self, user):
+        expected = set(Recipe.objects.filter(
+            author__in=Follow.objects.filter(user=user).values('author')
+        ).values_list('pk', flat=True))
+        self.assertEqual(
+            set(FeedItem.objects.feed(user, Recipe.objects.all())
+                .values_list('pk', flat=True)),
+            expected
+        )
+        items = set(FeedItem.objects.filter(user=user).values_list(
+            'recipe', flat=True))
+        self.assertEqual(
+            items, expected if FeedItem.objects.uses_table(user.pk) else set())
+
+    def test_follow_and_unfollow(self):
+        user = next(user for user in self.users if user not in self.authors)
+        for author in self.authors[:4]:
+            self.subscribe(user, author)
+            self.assert_feed(user)
+        for author in self.authors[:4]:
+            self.subscribe(user, author, 'delete')
+            self.assert_feed(user)
+
+    def test_recipe_created_and_deleted(self):
+        author, *others = self.authors
+        heavy, light = self.users[-2:], self.users[:3]
+        for user in heavy:
+            for followed in others[:2]:
+                self.subscribe(user, followed)
+        for user in (*heavy, *light):
+            if user != author:
+                self.subscribe(user, author)
+        recipe = Recipe.objects.create(
+            author=author, name='новый', text='', cooking_time=1)
+        self.assertEqual(
+            set(FeedItem.objects.filter(recipe=recipe).values_list(
+                'user', flat=True)),
+            {user.pk for user in heavy if user != author}
+        )
+        for user in (*heavy, *light):
+            self.assert_feed(user)
+        recipe.delete()
+        for user in (*heavy, *light):
+            self.assert_feed(user)
+
+
+# Таблицы, которые всегда читаются с основной БД: токены и членства
+# пользователя, которые потом кешируются.
+PRIMARY_TABLES = (
+    'authtoken_token', 'recipes_favorite', 'recipes_shoppingcart',
+    'users_follow',
+)
+
+
+@override_settings(
+    CACHES=DUMMY_CACHES, ASYNC_VIEWS=False,
+    DATABASE_REPLICAS=['replica_test']
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Чтение в RecipeViewSet, TagViewSet, IngredientViewSet
+    и CustomUserViewSet идёт на реплику, запись и чтение после неё -
+    в основную БД. Реплика - зеркало тестовой БД, поэтому данные
+    фиксируются, а не откатываются.
+    """
+
+    databases = {'default', 'replica_test'}
+
+    def setUp(self):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=2, recipes=3, ingredients=10,
+            per_recipe=(1, 2), favorites=0, carts=0, follows=0
+        )
+        self.recipe = dataset['recipes'].first()
+        # Версия справочника создаётся при первом чтении - записью.
+        for model in (Ingredient, Tag):
+            catalog_state(model)
+
+    def test_router(self):
+        replica_alias.set('replica_test')
+        try:
+            self.assertEqual(router.db_for_read(Recipe), 'replica_test')
+            self.assertEqual(router.db_for_read(Token), 'default')
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+            self.assertEqual(router.db_for_read(Recipe), 'default')
+        finally:
+            replica_alias.set(None)
+
+    def request(self, client, method, path):
+        primary = CaptureQueriesContext(connections['default'])
+        replica = CaptureQueriesContext(connections['replica_test'])
+        with primary, replica:
+            response = getattr(client, method)(path)
+        self.assertLess(response.status_code, 400)
+        return [
+            query['sql'] for query in primary
+            if not any(table in query['sql'] for table in PRIMARY_TABLES)
+        ], len(replica)
+
+    def test_requests(self):
+        anonymous = APIClient()
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/',
+                     '/api/tags/', '/api/ingredients/', '/api/users/'):
+            with self.subTest(path=path):
+                on_primary, on_replica = self.request(anonymous, 'get', path)
+                self.assertEqual(on_primary, [])
+                self.assertGreater(on_replica, 0)
+        token = Token.objects.create(user=self.recipe.author)
+        client = APIClient(HTTP_AUTHORIZATION=f'Token {token.key}')
+        on_primary, _ = self.request(client, 'get', '/api/users/me/')
+        self.assertEqual(on_primary, [])
+        favorite = f'/api/recipes/{self.recipe.pk}/favorite/'
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                _, on_replica = self.request(client, method, favorite)
+                self.assertEqual(on_replica, 0)
+
+
+class MembershipCacheTest(TestCase):
+    """Флаги избранного и корзины меняются сразу после изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=2, recipes=3, ingredients=10,
+            per_recipe=(1, 2), favorites=0, carts=0, follows=0
+        )
+        cls.recipe = dataset['recipes'].first()
+        cls.user = User.objects.get(pk=dataset['users'][0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flags(self):
+        data = self.client.get(f'/api/recipes/{self.recipe.pk}/').data
+        return data['is_favorited'], data['is_in_shopping_cart']
+
+    def test_toggle(self):
+        for method, expected in (('post', True), ('delete', False)):
+            with self.subTest(method=method):
+                for path in ('favorite', 'shopping_cart'):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        getattr(self.client, method)(
+                            f'/api/recipes/{self.recipe.pk}/{path}/')
+                self.assertEqual(self.flags(), (expected, expected))
+
+    def test_stale_reader(self):
+        # Запрос прочитал БД до коммита добавления, а записал набор
+        # в кеш уже после него.
+        self.assertEqual(self.flags(), (False, False))
+        key = membership_key('favorites', self.user.pk, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+        cache.set(key, array('q'), settings.MEMBERSHIP_CACHE_TTL)
+        self.assertIn(
+            self.recipe.pk, load_memberships(self.user.pk)['favorites'])
+        self.assertEqual(self.flags(), (True, False))
+
+
+class TokenCacheTest(TestCase):
+    """Закешированный токен перестаёт работать сразу после выхода."""
+
+    def tearDown(self):
+        cache.clear()
+        local_tokens.clear()
+
+    def me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def check(self, change):
+        for shared in (False, True):
+            with self.subTest(shared=shared), override_settings(
+                    TOKEN_CACHE_SHARED=shared):
+                self.user = User.objects.create_user(
+                    username=f'user-{shared}',
+                    email=f'user-{shared}@example.com', password='password')
+                token = Token.objects.create(user=self.user)
+                self.client = APIClient(
+                    HTTP_AUTHORIZATION=f'Token {token.key}')
+                self.assertEqual(self.me(), 200)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertEqual(self.me(), 401)
+
+    def test_logout(self):
+        self.check(lambda: self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204))
+
+    def test_deactivation(self):
+
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        self.check(deactivate)
+
+    def test_bulk_deactivation(self):
+
+        def deactivate():
+            users = User.objects.filter(pk=self.user.pk)
+            users.update(is_active=False)
+            # Без сигналов кеш всё ещё пускает пользователя.
+            self.assertEqual(self.me(), 200)
+            invalidate_user_tokens(users)
+
+        self.check(deactivate)
+
+
+class TrendingTest(TestCase):
+    """Счета трендов: порядок по свежести и учёт событий по отметке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=5, recipes=4, ingredients=10,
+            per_recipe=(1, 2), favorites=0, carts=0, follows=0
+        )
+        cls.users = dataset['users']
+        cls.recipes = list(dataset['recipes'].order_by('pk'))
+
+    def favorite(self, user_id, recipe, hours_ago=0):
+        favorite = Favorite.objects.create(user_id=user_id, recipe=recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created=timezone.now() - timedelta(hours=hours_ago))
+
+    def scores(self):
+        return dict(RecipeTrendingScore.objects.values_list('recipe', 'score'))
+
+    def test_synthetic_dataset(self):
+        # Отметка уже есть: часть добавлений окажется раньше неё.
+        RecipeTrendingScore.objects.update_scores()
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'trending', users=20, recipes=10,
+            ingredients=10, per_recipe=(1, 2), favorites=3, carts=2
+        )
+        RecipeTrendingScore.objects.update_scores()
+        self.assertEqual(
+            set(self.scores()),
+            set(dataset['recipes'].filter(
+                Q(favorites__isnull=False) | Q(carts__isnull=False)
+            ).values_list('pk', flat=True))
+        )
+
+    def test_ranking(self):
+        fresh, old, popular, empty = self.recipes
+        self.favorite(self.users[0], fresh, hours_ago=1)
+        self.favorite(self.users[0], old, hours_ago=24 * 7)
+        for user_id in self.users[:3]:
+            self.favorite(user_id, popular, hours_ago=24)
+        RecipeTrendingScore.objects.update_scores()
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'trending', 'limit': 4})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [popular.pk, fresh.pk, old.pk, empty.pk]
+        )
+
+    def test_watermark(self):
+        recipe = self.recipes[0]
+        self.favorite(self.users[0], recipe, hours_ago=1)
+        RecipeTrendingScore.objects.update_scores()
+        scores = self.scores()
+        # Событие моложе TRENDING_LAG ждёт следующего запуска.
+        self.favorite(self.users[1], recipe)
+        self.assertEqual(RecipeTrendingScore.objects.update_scores(), 0)
+        self.assertEqual(self.scores(), scores)
+        with override_settings(TRENDING_LAG=0):
+            self.assertEqual(RecipeTrendingScore.objects.update_scores(), 1)
+            self.assertGreater(self.scores()[recipe.pk], scores[recipe.pk])
+            scores = self.scores()
+            self.assertEqual(RecipeTrendingScore.objects.update_scores(), 0)
+            self.assertEqual(self.scores(), scores)
+        # Событие, записанное задним числом раньше отметки, учитывает
+        # только пересчёт.
+        self.favorite(self.users[2], recipe, hours_ago=2)
+        RecipeTrendingScore.objects.update_scores()
+        self.assertEqual(self.scores(), scores)
+        RecipeTrendingScore.objects.rebuild_recipes(
+            Recipe.objects.filter(pk=recipe.pk))
+        self.assertGreater(self.scores()[recipe.pk], scores[recipe.pk])
+        scores = self.scores()
+        with override_settings(TRENDING_LAG=0):
+            RecipeTrendingScore.objects.update_scores(rebuild=True)
+        self.assertAlmostEqual(self.scores()[recipe.pk], scores[recipe.pk])
+
+
+class CatalogVersionTest(TestCase):
+    """ETag справочника меняется после загрузки из другого процесса."""
+
+    def test_load_ingredients(self):
+        response = self.client.get('/api/ingredients/')
+        etag = response['ETag']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('соль,г\nсахар,г\n')
+            file.flush()
+            # Свой кеш у команды: как у отдельного процесса с locmem.
+            with override_settings(CACHES=DUMMY_CACHES):
+                call_command(
+                    'load_ingredients', file.name, stdout=io.StringIO())
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
+
+
+class RecipePayloadCacheTest(TestCase):
+    """Закешированные данные рецепта меняются вместе с рецептом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = create_synthetic_dataset(
+            random.Random(0), 'test', users=2, recipes=3, ingredients=10,
+            per_recipe=(2, 3)
+        )
+        cls.recipe = dataset['recipes'].first()
+        cls.path = f'/api/recipes/{cls.recipe.pk}/'
+
+    def test_related_changes(self):
+        self.client.get(self.path)
+        tag = self.recipe.tags.first()
+        tag.name = 'новое имя'
+        tag.save()
+        author = self.recipe.author
+        author.first_name = 'Новое'
+        author.save()
+        recipe_ingredient = self.recipe.recipeingredients.first()
+        recipe_ingredient.amount += 1
+        recipe_ingredient.save()
+        data = self.client.get(self.path).data
+        self.assertIn('новое имя', [item['name'] for item in data['tags']])
+        self.assertEqual(data['author']['first_name'], 'Новое')
+        self.assertIn(recipe_ingredient.amount, [
+            item['amount'] for item in data['ingredients']
+            if item['id'] == str(recipe_ingredient.ingredient_id)
+        ])
+
+    def test_tags_cleared(self):
+        self.client.get(self.path)
+        first, *others = self.recipe.tags.all()
+        first.recipe_set.clear()
+        Tag.objects.filter(pk__in=[tag.pk for tag in others]).delete()
+        self.assertEqual(self.client.get(self.path).data['tags'], [])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTest(TestCase):
+    """Статистика профилирования копится атомарными счётчиками кеша."""
+
+    def tearDown(self):
+        reset_report()
+
+    def test_report(self):
+        for _ in range(3):
+            self.client.get('/api/tags/')
+        stats = get_report()['GET tags-list']
+        self.assertEqual(stats['requests'], 3)
+        self.assertGreater(stats['total_ms'], 0)
+        reset_report()
+        self.assertEqual(get_report(), {})
+
+    def test_commands_need_shared_cache(self):
+        for command in ('profiling_report', 'cache_stats'):
+            with self.subTest(command=command):
+                with self.assertRaises(CommandError):
+                    call_command(command)
+
+
+class CollectRecipeImagesTest(TestCase):
+    """Переиспользованная картинка не считается старой и ничейной."""
+
+    def test_reused_image_is_kept(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media):
+            storage = image_storage()
+            name = storage.save('recipes/image.png', ContentFile(b'image'))
+            hours_ago = time.time() - 2 * 60 * 60
+            os.utime(storage.path(name), (hours_ago, hours_ago))
+            storage.save('recipes/image.png', ContentFile(b'image'))
+            call_command('collect_recipe_images', stdout=io.StringIO())
+            self.assertTrue(storage.exists(name))
+            os.utime(storage.path(name), (hours_ago, hours_ago))
+            call_command('collect_recipe_images', stdout=io.StringIO())
+            self.assertFalse(storage.exists(name))
+
+
+@override_settings(RECIPE_SEARCH_MAX_RESULTS=2)
+class RecipeSearchTest(TestCase):
+    """Фильтры применяются к поиску до ограничения числа результатов."""
+
+    def setUp(self):
+        recipe_search_index.invalidate()
+        users = create_synthetic_dataset(
+            random.Random(0), 'test', users=2, recipes=0, ingredients=0
+        )['users']
+        self.author = users[1]
+        for author in (users[1], users[0], users[0], users[0]):
+            Recipe.objects.create(
+                author_id=author, name='борщ', text='', cooking_time=1)
+
+    def tearDown(self):
+        recipe_search_index.invalidate()
+
+    def test_filtered_search(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'author': self.author})
+        self.assertEqual(
+            [recipe['author']['id'] for recipe in response.data['results']],
+            [self.author]
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Пул работает с PostgreSQL.')
+@override_settings(DB_HEALTH_CHECKS=True)
+class PooledConnectionTest(TestCase):
+    """Соединения из пула проходят проверку и переиспользуются."""
+
+    alias = 'pool-test'
+
+    def tearDown(self):
+        DatabaseWrapper.pools.pop(self.alias).closeall()
+
+    def test_checkout(self):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'ENGINE': 'foodgram.pooled_postgresql',
+        }, self.alias)
+        for _ in range(3):
+            wrapper.connect()
+            self.assertTrue(wrapper.get_autocommit())
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchone(), (1,))
+            wrapper.close()
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+from .async_views import async_urlpatterns
+from .views import (CacheStatsView, CustomUserViewSet, IngredientViewSet,
+                    RecipeViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -13,8 +15,13 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_urlpatterns(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken'))
 ]
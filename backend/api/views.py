@@ -1,32 +1,42 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
 from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Follow
 
+from .autocomplete import autocomplete
+from .cache import cache_stats, reset_cache_stats
 from .constants import DELETE_VALIDATION_ERRORS, POST_VALIDATION_ERRORS
+from .cookable import cookable_index
+from .exporters import EXPORTERS
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import ListRetrieveMixin
-from .pagination import CustomPaginator
+from .memberships import RECIPE_KINDS, update_memberships
+from .mixins import CachedListRetrieveMixin
+from .pagination import CustomPaginator, KeysetPaginator
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (CustomUserSerializer, GetRecipeSerializer,
                           IngredientSerializer, PostRecipeSerializer,
-                          ShortRecipeSerializer, SubscriptionSerializer,
-                          TagSerializer)
+                          RecipeIdsSerializer, ShortRecipeSerializer,
+                          SubscriptionSerializer, TagSerializer,
+                          get_recipes_limit, recent_recipes)
 
 User = get_user_model()
 
 
-class TagViewSet(ListRetrieveMixin):
+class TagViewSet(CachedListRetrieveMixin):
     """Теги."""
 
     queryset = Tag.objects.all()
@@ -34,7 +44,7 @@ class TagViewSet(ListRetrieveMixin):
     permission_classes = [AllowAny]
 
 
-class IngredientViewSet(ListRetrieveMixin):
+class IngredientViewSet(CachedListRetrieveMixin):
     """Ингредиенты."""
 
     queryset = Ingredient.objects.all()
@@ -42,6 +52,18 @@ class IngredientViewSet(ListRetrieveMixin):
     permission_classes = [AllowAny]
     filterset_class = IngredientFilter
 
+    @action(detail=False, methods=['GET'], filterset_class=None)
+    def autocomplete(self, request):
+        query = request.query_params.get('name', '').strip()
+        limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        try:
+            limit = min(int(request.query_params['limit']), limit)
+        except (KeyError, ValueError):
+            pass
+        if not query or limit < 1:
+            return Response([])
+        return Response(autocomplete(query, limit))
+
 
 class CustomUserViewSet(UserViewSet):
     """Юзеры."""
@@ -49,6 +71,7 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPaginator
+    cursor_ordering = 'id'
 
     @action(
         detail=False,
@@ -57,11 +80,15 @@ class CustomUserViewSet(UserViewSet):
         serializer_class=SubscriptionSerializer
     )
     def subscriptions(self, request):
-        user = request.user
-        favorites = user.followers.all()
-        users = User.objects.filter(id__in=[f.author.id for f in favorites])
+        limit = get_recipes_limit(request)
+        users = User.objects.filter(following__user=request.user).annotate(
+            recipes_count=Count('recipes', distinct=True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recent_recipes(limit),
+                     to_attr='recent_recipes')
+        ).order_by('id')
         paginated_queryset = self.paginate_queryset(users)
-        serializer = self.serializer_class(paginated_queryset, many=True)
+        serializer = self.get_serializer(paginated_queryset, many=True)
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -76,18 +103,21 @@ class CustomUserViewSet(UserViewSet):
             if user == author:
                 raise exceptions.ValidationError(
                     'Подписываться на себя запрещено.')
-            if Follow.objects.filter(user=user, author=author).exists():
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author=author)
+            except IntegrityError:
                 raise exceptions.ValidationError(
                     'Вы уже подписаны на этого пользователя.')
-            Follow.objects.create(user=user, author=author)
             serializer = self.get_serializer(author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if not Follow.objects.filter(user=user, author=author).exists():
+            deleted, _ = Follow.objects.filter(
+                user=user, author=author).delete()
+            if not deleted:
                 raise exceptions.ValidationError(
                     'Вы не подписаны на этого пользователя.')
-            Follow.objects.filter(user=user, author=author).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -100,49 +130,88 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        # Флаги is_favorited, is_in_shopping_cart и is_subscribed
+        # сериализаторы берут из кеша членств пользователя.
+        return Recipe.objects.select_related('author').defer(
+            'search_vector')
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return GetRecipeSerializer
         return PostRecipeSerializer
 
+    def get_read_serializer(self, recipe):
+        return GetRecipeSerializer(
+            instance=self.get_queryset().get(pk=recipe.pk),
+            context=self.get_serializer_context()
+        )
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer. is_valid(raise_exception=True)
         self.perform_create(serializer)
-        serializer = GetRecipeSerializer(
-            instance=serializer.instance, context={'request': request})
+        serializer = self.get_read_serializer(serializer.instance)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def update(self, request, *args, **kwargs):
-        recipe = Recipe.objects.get(pk=kwargs.get('pk'))
+        recipe = self.get_object()
         serializer = self.get_serializer(
             recipe, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        serializer = GetRecipeSerializer(
-            instance=serializer.instance, context={'request': request})
+        serializer = self.get_read_serializer(serializer.instance)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_200_OK, headers=headers)
 
+    @transaction.atomic
     def create_or_delete_recipe(self, user, recipe_pk, request, cls):
         recipe = get_object_or_404(Recipe, pk=recipe_pk)
 
         if request.method == 'POST':
-            if cls.objects.filter(user=user, recipe=recipe).exists():
+            if not cls.objects.add(user, [recipe.pk]):
                 raise exceptions.ValidationError(
                     POST_VALIDATION_ERRORS[cls.__name__])
-            cls.objects.create(user=user, recipe=recipe)
+            update_memberships(
+                user.pk, RECIPE_KINDS[cls], added=[recipe.pk])
             serializer = ShortRecipeSerializer(instance=recipe, context={
                 'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if not cls.objects.filter(user=user, recipe=recipe).exists():
+            if not cls.objects.remove(user, [recipe.pk]):
                 raise exceptions.ValidationError(
                     DELETE_VALIDATION_ERRORS[cls.__name__])
-            cls.objects.filter(user=user, recipe=recipe).delete()
+            update_memberships(
+                user.pk, RECIPE_KINDS[cls], removed=[recipe.pk])
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def bulk_create_or_delete_recipes(self, user, request, cls):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        recipes = Recipe.objects.in_bulk(ids)
+        missing = set(ids) - recipes.keys()
+        if missing:
+            raise exceptions.ValidationError({'ids': (
+                'Рецепты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.')})
+
+        if request.method == 'POST':
+            added = set(cls.objects.add(user, ids))
+            update_memberships(user.pk, RECIPE_KINDS[cls], added=added)
+            serializer = ShortRecipeSerializer(
+                [recipes[pk] for pk in ids if pk in added],
+                many=True,
+                context={'request': request}
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if request.method == 'DELETE':
+            removed = cls.objects.remove(user, ids)
+            update_memberships(user.pk, RECIPE_KINDS[cls], removed=removed)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=('POST', 'DELETE'), permission_classes=[
@@ -157,25 +226,113 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = self.request.user
         return self.create_or_delete_recipe(user, pk, request, ShoppingCart)
 
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='favorite/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_create_or_delete_recipes(
+            request.user, request, Favorite)
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_create_or_delete_recipes(
+            request.user, request, ShoppingCart)
+
+    def get_int_params(self, request, name):
+        """Числа из ?name=1,2,3 или ?name=1&name=2."""
+        try:
+            return [
+                int(value)
+                for values in request.query_params.getlist(name)
+                for value in values.split(',') if value.strip()
+            ]
+        except ValueError:
+            raise exceptions.ValidationError(
+                {name: 'Ожидаются целые числа через запятую.'})
+
+    @action(detail=False, methods=['GET'])
+    def cookable(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов ?ingredients=:
+        сначала полностью, затем с наименьшим числом недостающих.
+        """
+        ingredient_ids = self.get_int_params(request, 'ingredients')
+        max_missing = self.get_int_params(request, 'max_missing')
+        ranked = cookable_index.get().rank(
+            ingredient_ids, max_missing[0] if max_missing else None)
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        page = [item for item in page if item[0] in recipes]
+        serializer = GetRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        data = serializer.data
+        for item, (_, matched, missing) in zip(data, page):
+            item['matched_count'] = matched
+            item['missing_count'] = missing
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['GET'], permission_classes=[
+        IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов из подписок, по курсору."""
+        recipes = FeedItem.objects.feed(request.user, self.get_queryset())
+        paginator = KeysetPaginator()
+        page = paginator.paginate_queryset(recipes, request, self)
+        serializer = GetRecipeSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format выгрузки списка покупок выбирает экспортёр,
+        # а не рендерер DRF.
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     @action(detail=False, methods=['GET'], permission_classes=[
         IsAuthenticated])
     def download_shopping_cart(self, request):
-        shopping_cart = ShoppingCart.objects.filter(user=request.user)
-        recipes_id = [i.recipe.id for i in shopping_cart]
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes_id).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-            amount=Sum('amount'))
-        final_list = 'Список покупок от Foodgram\n\n'
-        for item in ingredients:
-            amount = item.get('amount')
-            final_list += (
-                f'{item["ingredient__name"]}'
-                f'({item["ingredient__measurement_unit"]}) {amount}\n'
-            )
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORTERS:
+            raise exceptions.ValidationError(
+                f'Доступные форматы: {", ".join(EXPORTERS)}.')
+        exporter, content_type = EXPORTERS[export_format]
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount')
+        ).order_by('name')
 
-        filename = 'foodgram_shopping_list.txt'
-        response = HttpResponse(final_list[:-1], content_type='text/plain')
+        filename = f'foodgram_shopping_list.{export_format}'
+        response = StreamingHttpResponse(
+            exporter(ingredients.iterator()), content_type=content_type)
         response['Content-Disposition'] = 'attachment; filename={0}'.format(
             filename)
         return response
+
+
+class CacheStatsView(APIView):
+    """Попадания и промахи кешей; DELETE обнуляет счётчики."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+    def delete(self, request):
+        reset_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,87 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+# Реплика, с которой читает текущий запрос; None - основная БД.
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+def check_connections(**kwargs):
+    """
+    Закрывает постоянные соединения, оборванные, пока они простаивали
+    между запросами: иначе первый запрос получил бы ошибку.
+    """
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+request_started.connect(check_connections)
+
+
+def view_path(view_func):
+    view = getattr(view_func, 'cls', None)
+    if view is None:
+        return None
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Безопасные запросы к view из REPLICA_READ_VIEWS читают со случайной
+    реплики из DATABASE_REPLICAS, одной на весь запрос.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replica_alias.set(
+            random.choice(settings.DATABASE_REPLICAS)
+            if settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and view_path(view_func) in settings.REPLICA_READ_VIEWS
+            else None
+        )
+
+    def process_response(self, request, response):
+        replica_alias.set(None)
+        return response
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение - с реплики, выбранной ReplicaRoutingMiddleware, запись -
+    в основную БД. После первой записи запрос до конца читает с основной
+    БД, чтобы видеть свои изменения. Токены всегда читаются с основной:
+    только что выданный токен мог ещё не дойти до реплики.
+    """
+
+    primary_apps = {'authtoken', 'sessions'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.primary_apps:
+            return 'default'
+        return replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        replica_alias.set(None)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит с основной БД через репликацию.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
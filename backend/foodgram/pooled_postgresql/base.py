@@ -0,0 +1,92 @@
+import threading
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2 import Error, extras
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    Пул, который при исчерпании ждёт свободного соединения до timeout
+    секунд, а не сразу падает. В простое держит minconn соединений.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolError('Нет свободных соединений с БД.')
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений в процессе: закрытое Django соединение
+    возвращается в пул, а новое берётся из пула без подключения
+    и аутентификации. Пул общий для всех потоков процесса.
+    """
+
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def get_pool(self, conn_params):
+        with self.pools_lock:
+            if self.alias not in self.pools:
+                self.pools[self.alias] = BlockingConnectionPool(
+                    settings.DB_POOL_MIN_SIZE,
+                    settings.DB_POOL_MAX_SIZE,
+                    settings.DB_POOL_TIMEOUT,
+                    **conn_params
+                )
+            return self.pools[self.alias]
+
+    def checkout(self, pool):
+        connection = pool.getconn()
+        if not settings.DB_HEALTH_CHECKS:
+            return connection
+        # Соединение могло быть закрыто сервером, пока лежало в пуле.
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # Без autocommit проверка открыла транзакцию, а Django
+            # включит autocommit, что psycopg2 внутри транзакции запрещает.
+            connection.rollback()
+        except Error:
+            pool.putconn(connection, close=True)
+            return pool.getconn()
+        return connection
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        connection = self.checkout(pool)
+        # Дальше - как в базовом классе, который сам открывает соединение.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pools[self.alias].putconn(self.connection)
@@ -0,0 +1,213 @@
+import hashlib
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from api.cache import counter_key, get_counter, incr_counter, reset_counter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+REPORT_KEY = 'profiling:report'
+ENDPOINTS_COUNTER = f'{REPORT_KEY}:endpoints'
+DUPLICATES_IN_REPORT = 5
+
+
+class QueryRecorder:
+    """execute_wrapper, который считает запросы и время в БД."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """Запросы, повторённые с разными параметрами: признак N+1."""
+        return {
+            sql: count for sql, count in self.statements.items() if count > 1
+        }
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} unresolved'
+    return f'{request.method} {match.url_name or match.view_name}'
+
+
+SUMMED_FIELDS = ('queries', 'db_ms', 'app_ms', 'render_ms', 'total_ms')
+COUNTED_FIELDS = ('requests', 'duplicate_queries', *SUMMED_FIELDS)
+STORED_FIELDS = ('name', *COUNTED_FIELDS, 'max_total_ms', 'duplicates')
+
+
+def stat_key(number, field):
+    key = f'{REPORT_KEY}:{number}:{field}'
+    return counter_key(key) if field in COUNTED_FIELDS else key
+
+
+def stat_counter(number, field):
+    return f'{REPORT_KEY}:{number}:{field}'
+
+
+def endpoint_key(name):
+    return f'{REPORT_KEY}:endpoint:{hashlib.sha256(name.encode()).hexdigest()}'
+
+
+def endpoint_number(name):
+    """
+    Номер эндпоинта в отчёте. Имена с пробелами не годятся в ключи
+    memcached, поэтому статистика хранится по номерам.
+    """
+    key = endpoint_key(name)
+    number = cache.get(key)
+    if number is not None:
+        return number
+    number = incr_counter(ENDPOINTS_COUNTER)
+    if cache.add(key, number, None):
+        cache.set(stat_key(number, 'name'), name, None)
+        return number
+    # Другой процесс зарегистрировал эндпоинт раньше; номер пропадает.
+    return cache.get(key)
+
+
+def record(name, sample, duplicates):
+    """
+    Счётчики меняются атомарным cache.incr, время хранится
+    в микросекундах. Максимум и самые частые повторы обновляются
+    чтением и записью: при одновременных запросах их значение
+    приблизительное, суммы - точные.
+    """
+    number = endpoint_number(name)
+    incr_counter(stat_counter(number, 'requests'))
+    incr_counter(stat_counter(number, 'duplicate_queries'), sum(
+        count - 1 for count in duplicates.values()))
+    incr_counter(stat_counter(number, 'queries'), sample['queries'])
+    for field in SUMMED_FIELDS[1:]:
+        incr_counter(
+            stat_counter(number, field), round(sample[field] * 1000))
+    max_key = stat_key(number, 'max_total_ms')
+    if sample['total_ms'] > cache.get(max_key, 0):
+        cache.set(max_key, sample['total_ms'], None)
+    if duplicates:
+        duplicates_key = stat_key(number, 'duplicates')
+        cache.set(duplicates_key, dict(
+            (Counter(cache.get(duplicates_key, {})) + Counter(duplicates))
+            .most_common(DUPLICATES_IN_REPORT)
+        ), None)
+
+
+def endpoint_numbers():
+    return range(1, get_counter(ENDPOINTS_COUNTER) + 1)
+
+
+def get_report():
+    report = {}
+    for number in endpoint_numbers():
+        values = cache.get_many(
+            [stat_key(number, field) for field in STORED_FIELDS])
+        stats = {
+            field: values.get(stat_key(number, field), 0)
+            for field in STORED_FIELDS
+        }
+        if not stats.pop('name'):
+            continue
+        for field in SUMMED_FIELDS[1:]:
+            stats[field] /= 1000
+        stats['duplicates'] = stats['duplicates'] or {}
+        report[values[stat_key(number, 'name')]] = stats
+    return report
+
+
+def reset_report():
+    keys = [endpoint_key(name) for name in get_report()]
+    keys += [
+        stat_key(number, field)
+        for number in endpoint_numbers() for field in STORED_FIELDS
+    ]
+    cache.delete_many(keys)
+    reset_counter(ENDPOINTS_COUNTER)
+
+
+class ProfilingMiddleware:
+    """
+    Замеряет для каждого запроса число SQL-запросов, время в БД,
+    время view вне БД (в основном сериализация), время рендеринга
+    ответа и общее время. Результат отдаётся в заголовке Server-Timing
+    и копится по эндпоинтам (GET recipes-list, POST recipes-favorite, ...).
+    Включается настройкой PROFILING_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.profiling_recorder = recorder
+        request.profiling_marks = {}
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        marks = request.profiling_marks
+        view_started = marks.get('view', started)
+        view_finished = marks.get('render', finished)
+        db_in_view = marks.get('render_db', recorder.duration)
+        sample = {
+            'queries': recorder.count,
+            'db_ms': recorder.duration * 1000,
+            'app_ms': max(
+                view_finished - view_started - db_in_view, 0) * 1000,
+            'render_ms': (finished - view_finished) * 1000,
+            'total_ms': (finished - started) * 1000,
+        }
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{sample["queries"]} queries";'
+            f'dur={sample["db_ms"]:.1f}',
+            f'app;dur={sample["app_ms"]:.1f}',
+            f'render;dur={sample["render_ms"]:.1f}',
+            f'total;dur={sample["total_ms"]:.1f}',
+        ))
+        record(endpoint_name(request), sample, recorder.duplicates())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profiling_marks['view'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после этого хука.
+        request.profiling_marks['render'] = time.perf_counter()
+        request.profiling_marks['render_db'] = (
+            request.profiling_recorder.duration)
+        return response
+
+
+class ProfilingReportView(APIView):
+    """Накопленная статистика по эндпоинтам; DELETE обнуляет её."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_report())
+
+    def delete(self, request):
+        reset_report()
+        return Response(status=status.HTTP_204_NO_CONTENT)
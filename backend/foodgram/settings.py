@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 
@@ -33,7 +34,10 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
 ]
 
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+
 MIDDLEWARE = [
+    'foodgram.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.db.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -63,7 +68,27 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# wsgi - gunicorn с синхронными воркерами, asgi - gunicorn с воркерами
+# uvicorn (см. gunicorn.conf.py). В режиме asgi горячие GET-адреса
+# обслуживаются асинхронными view в пуле из ASYNC_VIEW_THREADS потоков.
+# PROFILING_ENABLED делает цепочку middleware синхронной, поэтому
+# в режиме asgi его лучше не включать.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 8))
+
 
+# Соединения живут DB_CONN_MAX_AGE секунд (0 - закрываются после
+# каждого запроса) и проверяются в начале запроса, если включено
+# DB_HEALTH_CHECKS. DB_ENGINE=foodgram.pooled_postgresql включает пул
+# соединений в процессе; с ним обычно ставят DB_CONN_MAX_AGE=0.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 20))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
 
 DATABASES = {
     'default': {
@@ -73,10 +98,58 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+    }
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2. Остальные
+# параметры подключения - как у основной БД.
+for number, replica_host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+if sys.argv[1:2] == ['test']:
+    # Зеркало основной БД для тестов маршрутизации. В DATABASE_REPLICAS
+    # его добавляют только эти тесты, остальные читают с основной БД.
+    DATABASES['replica_test'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['foodgram.db.PrimaryReplicaRouter']
+REPLICA_READ_VIEWS = {
+    'api.views.RecipeViewSet',
+    'api.views.TagViewSet',
+    'api.views.IngredientViewSet',
+    'api.views.CustomUserViewSet',
+}
+
+# Redis и другие бэкенды подключаются полным путём к классу,
+# например CACHE_BACKEND=django_redis.cache.RedisCache.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
     }
 }
 
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 60 * 60))
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -115,15 +188,36 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
 
 AUTH_USER_MODEL = 'users.User'
 
+# Id рецептов в избранном и списке покупок и авторов в подписках
+# пользователя для флагов is_favorited, is_in_shopping_cart
+# и is_subscribed. Каждое изменение переводит их на новый ключ, поэтому
+# устаревший набор не читается; TTL лишь освобождает память кеша.
+MEMBERSHIP_CACHE_TTL = int(os.getenv('MEMBERSHIP_CACHE_TTL', 600))
+
+# Пользователь по токену кешируется в памяти процесса на
+# TOKEN_CACHE_LOCAL_TTL секунд, а с TOKEN_CACHE_SHARED ещё и в общем
+# кеше на TOKEN_CACHE_TTL. Выход и смена пароля сразу видны через общий
+# кеш, а в памяти других процессов - после TOKEN_CACHE_LOCAL_TTL.
+# Массовая правка User.objects...update() сигналов не отправляет: после
+# неё нужен api.authentication.invalidate_user_tokens, иначе токены
+# работают до TOKEN_CACHE_TTL.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10_000))
+TOKEN_CACHE_LOCAL_TTL = int(os.getenv('TOKEN_CACHE_LOCAL_TTL', 10))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True'
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -145,3 +239,26 @@ DJOSER = {
 }
 
 EMPTY_VALUE = '-пусто-'
+
+INGREDIENT_AUTOCOMPLETE_IN_MEMORY = (
+    os.getenv('INGREDIENT_AUTOCOMPLETE_IN_MEMORY', 'False') == 'True')
+INGREDIENT_AUTOCOMPLETE_TTL = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_TTL', 300))
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+RECIPE_SEARCH_INDEX_TTL = int(os.getenv('RECIPE_SEARCH_INDEX_TTL', 300))
+RECIPE_SEARCH_MAX_RESULTS = 1000
+
+COOKABLE_INDEX_TTL = int(os.getenv('COOKABLE_INDEX_TTL', 300))
+
+# Тренды: вес добавления в избранное и в список покупок и период
+# полураспада веса. Счета пересчитывает update_trending_scores;
+# после изменения параметров её запускают с --rebuild.
+TRENDING_FAVORITE_WEIGHT = float(os.getenv('TRENDING_FAVORITE_WEIGHT', 1))
+TRENDING_CART_WEIGHT = float(os.getenv('TRENDING_CART_WEIGHT', 0.5))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_LAG = int(os.getenv('TRENDING_LAG', 60))
+
+# После изменения порога ленты нужно пересобрать: rebuild_feeds.
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', 100))
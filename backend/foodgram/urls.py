@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .profiling import ProfilingReportView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/profiling/', ProfilingReportView.as_view(), name='profiling'),
     path('api/', include('api.urls'))
 ]
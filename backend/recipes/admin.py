@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.contrib import admin
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 
 
 @admin.register(Tag)
@@ -26,17 +26,16 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'author', 'favorites_amount')
+    list_display = ('pk', 'name', 'author', 'favorites_count',
+                    'in_carts_count')
     search_fields = ('name', 'author')
     list_filter = ('name', 'author', 'tags')
     empty_value_display = settings.EMPTY_VALUE
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = [
         RecipeIngredientInline,
     ]
 
-    def favorites_amount(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
@@ -54,3 +53,9 @@ class FavoriteAdmin(admin.ModelAdmin):
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     search_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
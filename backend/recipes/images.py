@@ -0,0 +1,100 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+
+
+def image_storage():
+    """Хранилище исходных картинок рецептов."""
+    return Recipe._meta.get_field('image').storage
+
+
+def variant_name(image_name, image_format, width):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = FORMATS[image_format][1]
+    return f'recipes/variants/{stem}_{width}.{extension}'
+
+
+def build_variants(image_name):
+    """
+    Уменьшенные копии картинки в JPEG и WebP для каждой ширины
+    из RECIPE_IMAGE_WIDTHS меньше исходной: {формат: {ширина: имя файла}}.
+    """
+    with image_storage().open(image_name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    variants = {image_format: {} for image_format in FORMATS}
+    widths = [
+        width for width in settings.RECIPE_IMAGE_WIDTHS if width < image.width
+    ] or [min(settings.RECIPE_IMAGE_WIDTHS)]
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        for image_format, (pil_format, _, options) in FORMATS.items():
+            name = variant_name(image_name, image_format, width)
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants[image_format][str(width)] = name
+    return variants
+
+
+def process_recipe_image(recipe_id, image_name):
+    """Строит варианты и сохраняет их, если картинка не успела смениться."""
+    variants = build_variants(image_name)
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).first()
+    if recipe is not None:
+        recipe.image_variants = variants
+        recipe.save(update_fields=['image_variants', 'updated'])
+
+
+def run_in_background(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        connections.close_all()
+
+
+def known_variants(image_name):
+    """Готовые варианты той же картинки у другого рецепта."""
+    recipe = Recipe.objects.filter(image=image_name).exclude(
+        image_variants={}).only('image_variants').first()
+    if recipe is None:
+        return {}
+    return recipe.image_variants
+
+
+def schedule_recipe_image(recipe):
+    """Ставит обработку картинки в пул потоков после коммита."""
+    global _executor
+    if not recipe.image or recipe.image_variants:
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    transaction.on_commit(lambda: _executor.submit(
+        run_in_background, recipe.pk, recipe.image.name))
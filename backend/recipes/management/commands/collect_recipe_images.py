@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import FORMATS, image_storage, variant_name
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из хранилища картинки, на которые не ссылается '
+        'ни один рецепт, вместе с их уменьшенными копиями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help=(
+                'Не трогать файлы моложе стольких минут: они могут '
+                'принадлежать ещё не сохранённому рецепту.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        directory = Recipe._meta.get_field('image').upload_to
+        referenced = set(
+            Recipe.objects.exclude(image='').values_list('image', flat=True))
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        removed = 0
+        for name in storage.blobs(directory):
+            if name in referenced or storage.get_modified_time(
+                    name) > threshold:
+                continue
+            if not options['dry_run']:
+                # Пока шёл обход, файл могли переиспользовать для нового
+                # рецепта: перед удалением ссылки и время проверяются заново.
+                if not self.is_orphan(storage, name, threshold):
+                    continue
+                self.delete(storage, name)
+            removed += 1
+            self.stdout.write(name)
+        action = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f'{action} картинок: {removed}.')
+
+    def is_orphan(self, storage, name, threshold):
+        return (
+            storage.get_modified_time(name) <= threshold
+            and not Recipe.objects.filter(image=name).exists()
+        )
+
+    def delete(self, storage, name):
+        storage.delete(name)
+        for image_format in FORMATS:
+            for width in settings.RECIPE_IMAGE_WIDTHS:
+                default_storage.delete(variant_name(name, image_format, width))
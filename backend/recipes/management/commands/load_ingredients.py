@@ -0,0 +1,120 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from api.cache import touch_catalog
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient
+
+FIELDS = ('name', 'measurement_unit')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or tuple(row[:2]) == FIELDS:
+            continue
+        yield row[0], row[1]
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из csv или json файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=f'{settings.BASE_DIR}/data/ingredients.csv',
+            help='Путь к файлу, по умолчанию data/ingredients.csv.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать файл и посчитать новые ингредиенты без записи.'
+        )
+
+    def unique_rows(self, rows):
+        seen = set()
+        for name, measurement_unit in rows:
+            key = (name.strip(), measurement_unit.strip())
+            self.read += 1
+            if not all(key) or key in seen:
+                continue
+            seen.add(key)
+            yield key
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format!r}, укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        self.read = 0
+        started = time.monotonic()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            rows = self.unique_rows(READERS[file_format](file))
+            if options['dry_run']:
+                existing = set(
+                    Ingredient.objects.values_list(*FIELDS).iterator())
+                unique = created = 0
+                for key in rows:
+                    unique += 1
+                    created += key not in existing
+            else:
+                unique, created = self.load(rows, options['batch_size'])
+        if created and not options['dry_run']:
+            touch_catalog(Ingredient)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            f'Прочитано строк: {self.read}, уникальных: {unique}, '
+            f'{"будет добавлено" if options["dry_run"] else "добавлено"}: '
+            f'{created}.'
+        )
+        self.stdout.write(
+            f'Время: {elapsed:.2f} с, '
+            f'{self.read / elapsed if elapsed else 0:.0f} строк/с.'
+        )
+
+    def load(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        unique = 0
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            unique += len(batch)
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        return unique, Ingredient.objects.count() - before
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать все рецепты, а не только без копий.'
+        )
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipes',
+            help='id рецепта; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.exclude(image='')
+        if options['recipes']:
+            queryset = queryset.filter(pk__in=options['recipes'])
+        elif not options['all']:
+            queryset = queryset.filter(image_variants={})
+        processed = failed = 0
+        for pk, image in queryset.values_list('pk', 'image').iterator():
+            try:
+                process_recipe_image(pk, image)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {pk}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(
+            f'Обработано картинок: {processed}, с ошибками: {failed}.')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу лент подписок для пользователей, у которых '
+        'подписок не меньше FEED_FANOUT_THRESHOLD. Нужно запускать после '
+        'изменения порога.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help='id пользователя; по умолчанию - все.'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        FeedItem.objects.rebuild(options['user'])
+        self.stdout.write(
+            f'Ленты пересобраны (порог {settings.FEED_FANOUT_THRESHOLD}), '
+            f'записей: {FeedItem.objects.count()}.')
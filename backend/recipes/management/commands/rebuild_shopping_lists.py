@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или проверяет списки покупок по корзинам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить таблицу с корзинами, ничего не меняя.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild(users)
+            self.stdout.write(
+                self.style.SUCCESS('Списки покупок пересобраны.'))
+            return
+
+        expected = ShoppingListItem.objects.expected(users)
+        queryset = ShoppingListItem.objects.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in queryset.values_list(
+                'user', 'ingredient', 'total_amount')
+        }
+        mismatches = [
+            (key, expected.get(key), actual.get(key))
+            for key in sorted(expected.keys() | actual.keys())
+            if expected.get(key) != actual.get(key)
+        ]
+        for (user_id, ingredient_id), need, have in mismatches:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидается {need}, в таблице {have}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS('Списки покупок согласованы.'))
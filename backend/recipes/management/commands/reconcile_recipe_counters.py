@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного и списков покупок у рецептов '
+        'с таблицами Favorite и ShoppingCart и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения.'
+        )
+
+    def handle(self, *args, **options):
+        counts = Recipe.objects.actual_counts()
+        mismatched = Recipe.objects.annotate(
+            actual_favorites=counts['favorites_count'],
+            actual_carts=counts['in_carts_count'],
+        ).exclude(
+            favorites_count=F('actual_favorites'),
+            in_carts_count=F('actual_carts')
+        ).values_list('pk', 'actual_favorites', 'actual_carts')
+        ids = []
+        for pk, favorites, carts in mismatched.iterator():
+            self.stdout.write(
+                f'Рецепт {pk}: в избранном {favorites}, в списках {carts}')
+            ids.append(pk)
+        if not options['dry_run']:
+            # Пересчёт в самом UPDATE не теряет изменения, сделанные
+            # после сверки.
+            for start in range(0, len(ids), 1000):
+                Recipe.objects.recount(ids[start:start + 1000])
+        self.stdout.write(f'Расхождений: {len(ids)}.')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeTrendingScore, TrendingState
+
+
+class Command(BaseCommand):
+    help = (
+        'Добавляет к счетам трендов рецептов новые добавления в избранное '
+        'и списки покупок с момента прошлого запуска. Запускается по '
+        'расписанию, например раз в несколько минут из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help=(
+                'Пересчитать счета по всем событиям, например после '
+                'изменения весов или периода полураспада.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        updated = RecipeTrendingScore.objects.update_scores(
+            rebuild=options['rebuild'])
+        state = TrendingState.objects.get(pk=1)
+        self.stdout.write(
+            f'Обновлено счетов: {updated}, события учтены до '
+            f'{state.processed_until:%Y-%m-%d %H:%M:%S}.')
@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    survivors = {}
+    duplicates = {}
+    for pk, name, measurement_unit in Ingredient.objects.order_by(
+            'pk').values_list('pk', 'name', 'measurement_unit'):
+        key = (name, measurement_unit)
+        if key in survivors:
+            duplicates[pk] = survivors[key]
+        else:
+            survivors[key] = pk
+    for duplicate, survivor in duplicates.items():
+        RecipeIngredient.objects.filter(
+            ingredient=duplicate).update(ingredient=survivor)
+        for item in ShoppingListItem.objects.filter(ingredient=duplicate):
+            merged = ShoppingListItem.objects.filter(
+                user=item.user_id, ingredient=survivor).first()
+            if merged is None:
+                item.ingredient_id = survivor
+                item.save(update_fields=['ingredient'])
+                continue
+            merged.total_amount += item.total_amount
+            merged.save(update_fields=['total_amount'])
+            item.delete()
+    Ingredient.objects.filter(pk__in=duplicates).delete()
+    # PostgreSQL откладывает проверки внешних ключей до конца транзакции,
+    # а ALTER TABLE с отложенными событиями триггеров падает. Проверки
+    # выполняются сразу, чтобы ограничение добавилось в той же миграции.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
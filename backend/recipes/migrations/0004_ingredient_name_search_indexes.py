@@ -0,0 +1,38 @@
+from django.db import migrations
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_upper_name_prefix '
+    'ON recipes_ingredient (UPPER(name) varchar_pattern_ops)',
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_upper_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_upper_name_prefix',
+    'DROP INDEX IF EXISTS recipes_ingredient_upper_name_trgm',
+)
+
+
+def run_on_postgresql(statements):
+    # istartswith и icontains на PostgreSQL сравнивают UPPER(name),
+    # поэтому индексы строятся по тому же выражению. На других СУБД
+    # миграция ничего не делает.
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(INDEXES), run_on_postgresql(DROP_INDEXES)),
+    ]
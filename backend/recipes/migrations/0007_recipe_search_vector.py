@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 04:26
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+FILL = (
+    "UPDATE recipes_recipe r SET search_vector = "
+    "setweight(to_tsvector(%(config)s::regconfig, r.name), 'A') || "
+    "setweight(to_tsvector(%(config)s::regconfig, coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), '')), 'B') || "
+    "setweight(to_tsvector(%(config)s::regconfig, r.text), 'C')"
+)
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector)'
+)
+DROP_INDEX = 'DROP INDEX IF EXISTS recipes_recipe_search_vector'
+
+
+# На других СУБД поиск идёт по индексу в памяти процесса,
+# поэтому обе операции выполняются только на PostgreSQL.
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(FILL, {'config': settings.RECIPE_SEARCH_CONFIG})
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            fill_search_vectors, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 04:31
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(model):
+    return Coalesce(models.Subquery(
+        model.objects.filter(recipe=models.OuterRef('pk')).values(
+            'recipe').annotate(total=models.Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count(apps.get_model('recipes', 'Favorite')),
+        in_carts_count=count(apps.get_model('recipes', 'ShoppingCart')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+def merge_duplicate_recipe_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        count=models.Count('pk'), total=models.Sum('amount'),
+        survivor=models.Min('pk')
+    ).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        RecipeIngredient.objects.filter(pk=duplicate['survivor']).update(
+            amount=duplicate['total'])
+        RecipeIngredient.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient']
+        ).exclude(pk=duplicate['survivor']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_recipe_ingredients, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipes_recipe_tags_tag_recipe'
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2 on 2026-10-18 04:56
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.timezone import utc
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feeditem'),
+    ]
+
+    # Время старых записей неизвестно: они получают дату начала отсчёта
+    # трендов и не поднимают рецепты в трендах.
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Счёт')),
+            ],
+            options={
+                'verbose_name': 'Счёт тренда',
+                'verbose_name_plural': 'Счета трендов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('processed_until', models.DateTimeField(verbose_name='Обработано до')),
+            ],
+            options={
+                'verbose_name': 'Состояние трендов',
+                'verbose_name_plural': 'Состояние трендов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=datetime.datetime(2023, 1, 1, 0, 0, tzinfo=utc), verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=datetime.datetime(2023, 1, 1, 0, 0, tzinfo=utc), verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipetrendingscore',
+            index=models.Index(fields=['-score'], name='recipe_trending_idx'),
+        ),
+    ]
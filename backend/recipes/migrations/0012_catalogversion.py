@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 05:12
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_trending_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('label', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Модель')),
+                ('version', models.UUIDField(default=uuid.uuid4, verbose_name='Версия')),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+    ]
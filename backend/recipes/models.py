@@ -1,6 +1,18 @@
+import math
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from users.models import User
+from django.db import connections, models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from users.models import Follow, User
+
+from .storage import recipe_image_storage
 
 
 class Tag(models.Model):
@@ -40,6 +52,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_measurement_unit'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -47,6 +65,42 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeManager(models.Manager):
+
+    def change_counter(self, field, recipe_ids, delta):
+        """Атомарно меняет счётчик рецептов на delta, не уходя ниже нуля."""
+        return self.filter(pk__in=recipe_ids).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+    def touch(self, recipe_ids):
+        """
+        Сдвигает время изменения рецептов: по нему строятся ключи кеша
+        их данных. Вызывается в той же транзакции, что и изменение.
+        """
+        return self.filter(pk__in=recipe_ids).update(updated=timezone.now())
+
+    def actual_counts(self):
+        """
+        Число записей Favorite и ShoppingCart у рецепта: коррелированные
+        подзапросы, а не JOIN обеих таблиц, который перемножил бы строки.
+        """
+
+        def count(model):
+            return Coalesce(Subquery(
+                model.objects.filter(recipe=OuterRef('pk')).values(
+                    'recipe').annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        return {
+            'favorites_count': count(Favorite),
+            'in_carts_count': count(ShoppingCart),
+        }
+
+    def recount(self, recipe_ids):
+        """Пересчитывает счётчики рецептов по Favorite и ShoppingCart."""
+        return self.filter(pk__in=recipe_ids).update(**self.actual_counts())
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -61,6 +115,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/',
+        storage=recipe_image_storage,
+        blank=True,
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
         blank=True,
     )
     text = models.TextField(
@@ -83,9 +143,38 @@ class Recipe(models.Model):
             )
         ]
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+    )
+    updated = models.DateTimeField(
+        'Изменён',
+        auto_now=True,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -93,6 +182,46 @@ class Recipe(models.Model):
         return self.name
 
 
+class RecipeIngredientManager(models.Manager):
+
+    @transaction.atomic
+    def replace(self, recipe, amounts):
+        """
+        Приводит состав рецепта к amounts ({id ингредиента: количество}):
+        удаление, изменение количества и добавление - по одному запросу.
+        Удаление тоже идёт без сигналов: обработчики post_delete на
+        каждую строку правили бы списки покупок и отмечали рецепт по
+        разу. Изменения списков покупок применяются здесь одним
+        change_recipe, рецепт отмечается один раз; поисковые индексы
+        обновит сохранение рецепта, которое следует за заменой состава.
+        """
+        amounts = dict(amounts)
+        changes = Counter()
+        removed, changed = [], []
+        for recipe_ingredient in recipe.recipeingredients.all():
+            ingredient_id = recipe_ingredient.ingredient_id
+            amount = amounts.pop(ingredient_id, 0)
+            if not amount:
+                removed.append(recipe_ingredient.pk)
+                changes[ingredient_id] -= recipe_ingredient.amount
+            elif amount != recipe_ingredient.amount:
+                changes[ingredient_id] = amount - recipe_ingredient.amount
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            self.filter(pk__in=removed)._raw_delete(
+                router.db_for_write(self.model))
+        self.bulk_update(changed, ['amount'])
+        self.bulk_create(
+            self.model(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
+        changes.update(amounts)
+        ShoppingListItem.objects.change_recipe(recipe, changes)
+        Recipe.objects.touch([recipe.pk])
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -116,12 +245,105 @@ class RecipeIngredient(models.Model):
         ]
     )
 
+    objects = RecipeIngredientManager()
+
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
 
 
+class UserRecipeManager(models.Manager):
+    """
+    Добавление и удаление рецептов в избранном или списке покупок
+    одним запросом: INSERT ... ON CONFLICT DO NOTHING и DELETE,
+    которые возвращают затронутые рецепты. Между проверкой и записью
+    нет окна для гонки, а повторный запрос не падает на уникальности.
+    """
+
+    @property
+    def write_db(self):
+        return self._db or router.db_for_write(self.model)
+
+    def execute(self, sql, params):
+        with connections[self.write_db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def names(self):
+        quote_name = connections[self.write_db].ops.quote_name
+        return (
+            quote_name(self.model._meta.db_table),
+            quote_name(self.model._meta.get_field('user').column),
+            quote_name(self.model._meta.get_field('recipe').column),
+            quote_name(self.model._meta.get_field('created').column),
+        )
+
+    @transaction.atomic
+    def add(self, user, recipe_ids):
+        """Добавляет рецепты; возвращает id тех, которых ещё не было."""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return []
+        table, user_column, recipe_column, created_column = self.names()
+        created = timezone.now()
+        added = self.execute(
+            f'INSERT INTO {table} ({user_column}, {recipe_column}, '
+            f'{created_column}) VALUES '
+            + ', '.join(['(%s, %s, %s)'] * len(recipe_ids))
+            + f' ON CONFLICT DO NOTHING RETURNING {recipe_column}',
+            [
+                value for pk in recipe_ids
+                for value in (user.pk, pk, created)
+            ]
+        )
+        Recipe.objects.change_counter(self.model.counter_field, added, 1)
+        return added
+
+    @transaction.atomic
+    def remove(self, user, recipe_ids):
+        """Удаляет рецепты; возвращает id тех, что действительно были."""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return []
+        table, user_column, recipe_column, _ = self.names()
+        removed = self.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {recipe_column} IN ({", ".join(["%s"] * len(recipe_ids))}) '
+            f'RETURNING {recipe_column}',
+            [user.pk, *recipe_ids]
+        )
+        Recipe.objects.change_counter(self.model.counter_field, removed, -1)
+        return removed
+
+
+class ShoppingCartManager(UserRecipeManager):
+    """
+    Сырые INSERT и DELETE не отправляют сигналов, поэтому списки
+    покупок, как и счётчики, обновляются здесь.
+    """
+
+    @transaction.atomic
+    def add(self, user, recipe_ids):
+        added = super().add(user, recipe_ids)
+        ShoppingListItem.objects.add_recipes(user.pk, added)
+        return added
+
+    @transaction.atomic
+    def remove(self, user, recipe_ids):
+        removed = super().remove(user, recipe_ids)
+        ShoppingListItem.objects.remove_recipes(user.pk, removed)
+        return removed
+
+
 class Favorite(models.Model):
+    counter_field = 'favorites_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -134,6 +356,13 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
+
+    objects = UserRecipeManager()
 
     class Meta:
         ordering = ['-id']
@@ -151,6 +380,8 @@ class Favorite(models.Model):
 
 
 class ShoppingCart(models.Model):
+    counter_field = 'in_carts_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -163,6 +394,13 @@ class ShoppingCart(models.Model):
         related_name='carts',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
+
+    objects = ShoppingCartManager()
 
     class Meta:
         ordering = ['-id']
@@ -178,3 +416,494 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username} добавил'
                 f'{self.recipe.name} в список покупок')
+
+
+class ShoppingListItemManager(models.Manager):
+    """Инкрементальное обслуживание списков покупок."""
+
+    UPSERT_BATCH_SIZE = 500
+
+    @property
+    def write_db(self):
+        return self._db or router.db_for_write(self.model)
+
+    def upsert(self, rows):
+        """
+        Прибавляет количество к позициям (user_id, ingredient_id, delta)
+        одним INSERT ... ON CONFLICT DO UPDATE: позицию, которую
+        одновременно создала другая транзакция, запрос дополнит,
+        а не упадёт на уникальности.
+        """
+        quote_name = connections[self.write_db].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        user, ingredient, total_amount = (
+            quote_name(self.model._meta.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount')
+        )
+        with connections[self.write_db].cursor() as cursor:
+            for start in range(0, len(rows), self.UPSERT_BATCH_SIZE):
+                batch = rows[start:start + self.UPSERT_BATCH_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} ({user}, {ingredient}, '
+                    f'{total_amount}) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT ({user}, {ingredient}) DO UPDATE '
+                    f'SET {total_amount} = {table}.{total_amount} '
+                    f'+ EXCLUDED.{total_amount}',
+                    [value for row in batch for value in row]
+                )
+
+    def apply_changes(self, user_ids, changes):
+        """
+        Изменяет количество ингредиентов в списках покупок пользователей.
+        changes - словарь {id ингредиента: изменение количества}.
+        """
+        changes = {
+            ingredient_id: delta
+            for ingredient_id, delta in changes.items() if delta
+        }
+        if not changes:
+            return
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        removed = {
+            ingredient_id: delta
+            for ingredient_id, delta in changes.items() if delta < 0
+        }
+        with transaction.atomic(using=self.write_db):
+            # Строки блокируются в одном порядке, чтобы одновременные
+            # изменения пересекающихся списков не ждали друг друга
+            # по кругу. Новые позиции вставляются в том же порядке.
+            list(
+                self.select_for_update()
+                .filter(user__in=user_ids, ingredient__in=changes)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            self.upsert([
+                (user_id, ingredient_id, changes[ingredient_id])
+                for user_id in user_ids
+                for ingredient_id in sorted(changes)
+                if changes[ingredient_id] > 0
+            ])
+            if not removed:
+                return
+            items = self.filter(user__in=user_ids, ingredient__in=removed)
+            items.update(total_amount=Greatest(
+                F('total_amount') + models.Case(
+                    *(
+                        models.When(ingredient=ingredient_id, then=delta)
+                        for ingredient_id, delta in removed.items()
+                    ),
+                    default=0
+                ),
+                0
+            ))
+            items.filter(total_amount=0).delete()
+
+    def recipe_amounts(self, recipes):
+        """Суммарное количество каждого ингредиента в рецептах."""
+        return dict(
+            RecipeIngredient.objects.filter(recipe__in=recipes)
+            .values_list('ingredient').annotate(Sum('amount'))
+            .order_by()
+        )
+
+    def add_recipes(self, user_id, recipes):
+        if recipes:
+            self.apply_changes([user_id], self.recipe_amounts(recipes))
+
+    def remove_recipes(self, user_id, recipes):
+        if not recipes:
+            return
+        changes = Counter()
+        changes.subtract(self.recipe_amounts(recipes))
+        self.apply_changes([user_id], changes)
+
+    def change_recipe(self, recipe, changes):
+        """Применяет изменение ингредиентов рецепта ко всем корзинам."""
+        self.apply_changes(
+            ShoppingCart.objects.filter(recipe=recipe)
+            .values_list('user', flat=True),
+            changes
+        )
+
+    def expected(self, users=None):
+        """Список покупок, посчитанный заново по корзинам."""
+        queryset = RecipeIngredient.objects.all()
+        if users is not None:
+            queryset = queryset.filter(recipe__carts__user__in=users)
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in queryset.values_list(
+                'recipe__carts__user', 'ingredient'
+            ).annotate(Sum('amount')).order_by()
+            if user_id is not None
+        }
+
+    @transaction.atomic
+    def rebuild(self, users=None):
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        queryset.delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=amount
+                )
+                for (user_id, ingredient_id), amount
+                in self.expected(users).items()
+            ),
+            batch_size=1000
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        'Количество',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_shopping_list'
+            )
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+
+    def __str__(self):
+        return f'{self.ingredient.name} {self.total_amount}'
+
+
+class FeedItemManager(models.Manager):
+    """
+    Лента рецептов авторов, на которых подписан пользователь. Если
+    подписок меньше FEED_FANOUT_THRESHOLD, лента собирается одним
+    запросом по Recipe(author, -id). Для остальных пользователей новые
+    рецепты заранее раскладываются по их лентам в FeedItem.
+    """
+
+    def uses_table(self, user_id):
+        return Follow.objects.filter(
+            user=user_id).count() >= settings.FEED_FANOUT_THRESHOLD
+
+    def feed(self, user, recipes):
+        """Рецепты ленты из queryset recipes."""
+        if self.uses_table(user.pk):
+            return recipes.filter(feed_items__user=user)
+        return recipes.filter(author__in=Follow.objects.filter(
+            user=user).values('author'))
+
+    def heavy_followers(self, author_id):
+        """Подписчики автора, ленты которых хранятся в таблице."""
+        return Follow.objects.filter(
+            user__in=Follow.objects.filter(
+                author=author_id).values('user')
+        ).values('user').annotate(
+            follows=Count('pk')
+        ).filter(
+            follows__gte=settings.FEED_FANOUT_THRESHOLD
+        ).values_list('user', flat=True).order_by()
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты подписчиков автора."""
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe=recipe)
+                for user_id in self.heavy_followers(recipe.author_id)
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def fill(self, user_id, authors):
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in Recipe.objects.filter(
+                    author__in=authors).values_list('pk', flat=True)
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def follow(self, user_id, author_id):
+        """
+        После новой подписки: на пороге лента заполняется целиком,
+        выше порога в неё добавляются рецепты нового автора.
+        """
+        follows = Follow.objects.filter(user=user_id).count()
+        if follows == settings.FEED_FANOUT_THRESHOLD:
+            self.fill(user_id, Follow.objects.filter(
+                user=user_id).values('author'))
+        elif follows > settings.FEED_FANOUT_THRESHOLD:
+            self.fill(user_id, [author_id])
+
+    def unfollow(self, user_id, author_id):
+        """После отписки; ниже порога лента снова собирается на лету."""
+        follows = Follow.objects.filter(user=user_id).count()
+        items = self.filter(user=user_id)
+        if follows >= settings.FEED_FANOUT_THRESHOLD:
+            items = items.filter(recipe__author=author_id)
+        items.delete()
+
+    def rebuild(self, users=None):
+        """Пересобирает ленты, например после смены порога."""
+        items = self.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        items.delete()
+        heavy = Follow.objects.values('user').annotate(
+            follows=Count('pk')
+        ).filter(
+            follows__gte=settings.FEED_FANOUT_THRESHOLD
+        ).values_list('user', flat=True).order_by()
+        if users is not None:
+            heavy = heavy.filter(user__in=users)
+        for user_id in heavy:
+            self.fill(user_id, Follow.objects.filter(
+                user=user_id).values('author'))
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+
+    objects = FeedItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe_feed'
+            )
+        ]
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.recipe.name} в ленте {self.user.username}'
+
+
+# Начало отсчёта для счетов трендов, см. TrendingScoreManager.
+TRENDING_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def logaddexp(a, b):
+    """log(exp(a) + exp(b)) без переполнения; None - пустая сумма."""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TrendingScoreManager(models.Manager):
+    """
+    Счёт рецепта - сумма весов добавлений в избранное и списки покупок,
+    которые затухают экспоненциально с периодом полураспада
+    TRENDING_HALF_LIFE_HOURS. Хранится логарифм суммы весов, приведённых
+    к TRENDING_EPOCH: log sum(w * exp((t - эпоха) / tau)). С течением
+    времени все счета умножаются на один и тот же множитель, поэтому
+    порядок рецептов не меняется и сохранённые счета не пересчитываются:
+    к ним только прибавляются новые события.
+    """
+
+    def events(self):
+        return (
+            (Favorite, settings.TRENDING_FAVORITE_WEIGHT),
+            (ShoppingCart, settings.TRENDING_CART_WEIGHT),
+        )
+
+    def collect(self, since, until, recipes=None):
+        """
+        {id рецепта: счёт} событий в интервале (since, until]; recipes -
+        queryset рецептов, если учитываются не все.
+        """
+        tau = settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+        scores = {}
+        for model, weight in self.events():
+            events = model.objects.filter(
+                created__gt=since, created__lte=until
+            ).values_list('recipe_id', 'created').order_by()
+            if recipes is not None:
+                events = events.filter(recipe__in=recipes)
+            for recipe_id, created in events.iterator():
+                scores[recipe_id] = logaddexp(
+                    scores.get(recipe_id),
+                    (created - TRENDING_EPOCH).total_seconds() / tau
+                    + math.log(weight)
+                )
+        return scores
+
+    def add(self, scores, batch_size=1000):
+        """Прибавляет счета к сохранённым."""
+        recipe_ids = list(scores)
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            stored = self.in_bulk(batch)
+            changed = []
+            for item in stored.values():
+                item.score = logaddexp(item.score, scores[item.pk])
+                changed.append(item)
+            self.bulk_update(changed, ['score'])
+            # Рецепт мог быть удалён после выборки событий.
+            self.bulk_create(
+                self.model(recipe_id=pk, score=scores[pk])
+                for pk in Recipe.objects.filter(
+                    pk__in=batch).exclude(
+                        pk__in=stored).values_list('pk', flat=True)
+            )
+
+    @transaction.atomic
+    def rebuild_recipes(self, recipes):
+        """
+        Пересчитывает счета рецептов из queryset recipes по событиям до
+        отметки update_scores, например после записи событий задним
+        числом: сам update_scores их уже не увидит. События после
+        отметки учтёт его следующий запуск.
+        """
+        state = TrendingState.objects.select_for_update().filter(
+            pk=1).first()
+        self.filter(recipe__in=recipes).delete()
+        if state is None:
+            return 0
+        scores = self.collect(TRENDING_EPOCH, state.processed_until, recipes)
+        self.add(scores)
+        return len(scores)
+
+    @transaction.atomic
+    def update_scores(self, rebuild=False):
+        """
+        Учитывает события после сохранённой отметки и сдвигает её.
+        События моложе TRENDING_LAG секунд ждут следующего запуска:
+        транзакции, которые их пишут, могут быть ещё не завершены.
+        Возвращает число рецептов, у которых изменился счёт.
+        """
+        state, _ = TrendingState.objects.select_for_update().get_or_create(
+            pk=1, defaults={'processed_until': TRENDING_EPOCH})
+        if rebuild:
+            self.all().delete()
+            state.processed_until = TRENDING_EPOCH
+        until = timezone.now() - timedelta(seconds=settings.TRENDING_LAG)
+        if until <= state.processed_until:
+            return 0
+        scores = self.collect(state.processed_until, until)
+        self.add(scores)
+        state.processed_until = until
+        state.save()
+        return len(scores)
+
+
+class RecipeTrendingScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(verbose_name='Счёт')
+
+    objects = TrendingScoreManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='recipe_trending_idx')
+        ]
+        verbose_name = 'Счёт тренда'
+        verbose_name_plural = 'Счета трендов'
+
+    def __str__(self):
+        return f'{self.recipe.name}: {self.score:.3f}'
+
+
+class TrendingState(models.Model):
+    """Отметка времени, до которой события учтены в счетах трендов."""
+
+    processed_until = models.DateTimeField(verbose_name='Обработано до')
+
+    class Meta:
+        verbose_name = 'Состояние трендов'
+        verbose_name_plural = 'Состояние трендов'
+
+    def __str__(self):
+        return f'Обработано до {self.processed_until}'
+
+
+class CatalogVersionManager(models.Manager):
+
+    def state(self, model):
+        """Версия и время последнего изменения справочника model."""
+        # get_or_create ходит в БД для записи, и запрос до конца читал бы
+        # с основной БД, поэтому сначала - обычное чтение.
+        label = model._meta.label_lower
+        catalog = self.filter(label=label).first()
+        if catalog is None:
+            catalog, _ = self.get_or_create(label=label)
+        return catalog.version.hex, int(catalog.modified.timestamp())
+
+    def touch(self, model):
+        self.update_or_create(
+            label=model._meta.label_lower,
+            defaults={'version': uuid.uuid4(), 'modified': timezone.now()}
+        )
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия справочника: по ней строятся ETag и ключи кеша ответов.
+    Хранится в БД, чтобы изменения из любого процесса, в том числе
+    из команд загрузки, сразу видели все воркеры.
+    """
+
+    label = models.CharField(
+        'Модель',
+        max_length=100,
+        primary_key=True,
+    )
+    version = models.UUIDField(
+        'Версия',
+        default=uuid.uuid4,
+    )
+    modified = models.DateTimeField(
+        'Изменён',
+        default=timezone.now,
+    )
+
+    objects = CatalogVersionManager()
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.label}: {self.version}'
@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит файл под sha256 его содержимого: dir/ab/cd/<sha256>.<ext>.
+    Повторная загрузка того же файла не пишет его заново.
+    """
+
+    def hashed_name(self, directory, digest, extension):
+        return os.path.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}')
+
+    def digest(self, content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        return sha256.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, filename = os.path.split(name)
+        name = self.hashed_name(
+            directory, self.digest(content), os.path.splitext(filename)[1])
+        if self.exists(name):
+            self.touch(name)
+            return name
+        return super().save(name, content, max_length)
+
+    def touch(self, name):
+        """
+        Обновляет время изменения переиспользованного файла, чтобы
+        collect_recipe_images не счёл его старым и ничейным, пока
+        рецепт со ссылкой на него ещё не сохранён.
+        """
+        os.utime(self.path(name))
+
+    def blobs(self, directory):
+        """Все файлы, сохранённые под хешем в directory."""
+        for first in self.listdir(directory)[0]:
+            if len(first) != 2:
+                continue
+            for second in self.listdir(os.path.join(directory, first))[0]:
+                path = os.path.join(directory, first, second)
+                for filename in self.listdir(path)[1]:
+                    yield os.path.join(path, filename)
+
+
+recipe_image_storage = ContentAddressedStorage()